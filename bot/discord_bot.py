@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
 import aiohttp
+import aiofiles
+import aiofiles.os
 import certifi
 import logging
 import ssl
@@ -9,14 +11,18 @@ import json
 import os
 import sys
 import random
+import string
+import contextlib
+from collections import OrderedDict, deque
 from io import BytesIO
 from urllib.parse import urlparse
 from curl_cffi import requests as curl_requests
-from typing import List, Optional, Dict, Tuple
+from typing import Any, AsyncIterator, Deque, List, Optional, Dict, Tuple
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from bot.discord_types import DiscordUserDataType, BotSettingsDataType
+from bot.discord_types import BotSettingsDataType
 from store_data_extractor.store_types import ProductDataType
+from utils.rate_limiter import TokenBucket
 
 # Path to the config directory
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config")
@@ -27,6 +33,123 @@ SETTINGS_FILE_PATH = os.path.join(CONFIG_PATH, "settings.json")
 # Path to the welcome messages file
 WELCOME_MESSAGES_FILE_PATH = os.path.join(CONFIG_PATH, "welcome_messages.txt")
 
+# Discord message limits and defaults for batched product notifications
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+DEFAULT_PRODUCT_BATCH_SIZE = MAX_EMBEDS_PER_MESSAGE
+DEFAULT_PRODUCT_BATCH_INTERVAL_SECONDS = 1.0 # Average spacing between messages to one channel, 5 per 5 seconds
+CHANNEL_SEND_BURST = 5 # Discord's per-channel bucket, messages that may go out back to back
+
+# Product images downloaded ahead of the message being built, bounded for the Pi's memory
+IMAGE_PREFETCH_AHEAD = 4
+
+# Message prefix that shows the help embed
+HELP_COMMAND = "!help"
+
+# How long shutdown waits for queued product posts before stopping the channel workers
+CHANNEL_DRAIN_TIMEOUT_SECONDS = 10.0
+
+# Attempts for a single message on connection errors, discord.py already retries 429 and 5xx itself
+SEND_MAX_RETRIES = 3
+
+# Welcome batching defaults, joins within the window share one message
+DEFAULT_WELCOME_BATCH_WINDOW_SECONDS = 3.0
+DEFAULT_WELCOME_MAX_BATCH = 10
+WELCOME_QUEUE_MAX_SIZE = 1000
+KNOWN_USERS_CACHE_SIZE = 50000
+
+# SSL context with the certifi CA bundle, built once for every bot instance.
+# create_default_context already requires certificates and checks hostnames.
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+# Muted pink used when settings do not define a valid embed color
+DEFAULT_EMBED_COLOR = (214, 140, 184)
+
+# Bound format methods, so the format spec is not rebuilt for every product
+format_jpy_price = "¥{:,.0f}".format
+format_eur_price = "€{:.2f}".format
+
+
+def format_product_prices(raw_prices: Any) -> str:
+    """Format the JPY and EUR prices of a product for an embed description."""
+    if not isinstance(raw_prices, dict):
+        return "No price available"
+
+    # Only JPY and EUR are shown, so look those up instead of walking every key
+    jpy = raw_prices.get('JPY')
+    eur = raw_prices.get('EUR')
+    price_text: List[str] = []
+    if isinstance(jpy, (int, float)):
+        price_text.append(format_jpy_price(jpy))
+    if isinstance(eur, (int, float)):
+        price_text.append(format_eur_price(eur))
+
+    return " / ".join(price_text) if price_text else "No price available"
+
+
+def build_product_embed(product: ProductDataType, embed_color: discord.Color) -> discord.Embed:
+    """Build the embed for one product, without its image attachment."""
+    product_url = str(product.get('product_url', '#'))
+    return discord.Embed(
+        title=str(product.get('name', 'No name available')),
+        description=f"💰 {format_product_prices(product.get('prices', {}))}\n🔗 [View product]({product_url})",
+        color=embed_color
+    )
+
+
+# A welcome message split around its {member} placeholders, rendered with mentions.join(parts)
+WelcomeMessage = Tuple[str, ...]
+
+
+def compile_welcome_message(line: str) -> Optional[WelcomeMessage]:
+    """Split a welcome message around {member}; None when it uses any other placeholder."""
+    parts: List[str] = [""]
+    try:
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(line):
+            parts[-1] += literal
+            if field_name is None:
+                continue
+            if field_name != "member" or format_spec or conversion:
+                return None
+            parts.append("")
+    except ValueError: # Unbalanced braces
+        return None
+    return tuple(parts)
+
+
+# "Welcome to the Jirai Sweeties server, {member}! We're glad to have you here!"
+FALLBACK_WELCOME_MESSAGE: WelcomeMessage = ("Welcome to the Jirai Sweeties server, ", "! We're glad to have you here!")
+
+
+# Settings keys the bot cannot run without
+REQUIRED_SETTINGS_KEYS = ("new_items_channel_name", "welcome_channel_name")
+
+# Parsed settings per file path, stored with the st_mtime_ns they were read at
+_settings_cache: Dict[str, Tuple[int, BotSettingsDataType]] = {}
+
+
+async def load_settings(path: str) -> BotSettingsDataType:
+    """Parse the settings file and reuse the result until the file's st_mtime_ns changes."""
+    mtime_ns = (await aiofiles.os.stat(path)).st_mtime_ns
+    cached = _settings_cache.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        async with aiofiles.open(path, 'r') as f:
+            bot_settings = json.loads(await f.read())
+        validate_settings(bot_settings, path)
+        cached = (mtime_ns, bot_settings)
+        _settings_cache[path] = cached
+    return cached[1]
+
+
+def validate_settings(bot_settings: Any, path: str) -> None:
+    """Fail fast at startup when the settings file is missing required values."""
+    if not isinstance(bot_settings, dict):
+        raise ValueError(f"Settings file {path} must contain a JSON object.")
+    for key in REQUIRED_SETTINGS_KEYS:
+        if not isinstance(bot_settings.get(key), str) or not bot_settings[key]:
+            raise ValueError(f"Settings file {path} is missing a '{key}' string.")
+
+
 class DiscordBot(commands.Bot):
     """Discord bot class to interact with the Discord API."""
     def __init__(self, store_manager=None) -> None:
@@ -34,11 +157,7 @@ class DiscordBot(commands.Bot):
         intents.message_content = True
         intents.members = True # Enable the members intent for member join events
 
-        # Create SSL context with certifi
-        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
-        self.ssl_context.verify_mode = ssl.CERT_REQUIRED
-        self.ssl_context.check_hostname = True
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
+        connector = aiohttp.TCPConnector(ssl=SSL_CONTEXT)
 
         super().__init__(command_prefix='!', intents=intents, connector=connector)
 
@@ -49,10 +168,41 @@ class DiscordBot(commands.Bot):
         self.discord_db = DiscordDatabase() # Discord database instance
         self.logger = logging.getLogger("DiscordBot") # Logger instance for the bot with the name "DiscordBot"
 
-        self.lock = asyncio.Lock() # Async lock to prevent concurrent message sending
-        self.bot_settings: Optional[BotSettingsDataType] = None # Bot configuration settings
-        with open(SETTINGS_FILE_PATH, 'r') as f:
-            self.bot_settings = json.load(f)
+        # Per-channel product queues, each drained by its own worker task
+        self._channel_queues: Dict[int, asyncio.Queue] = {}
+        self._channel_workers: Dict[int, asyncio.Task[None]] = {}
+        self._send_limiters: Dict[int, TokenBucket] = {} # Per-channel pacing for every message the bot sends
+        self._queued_product_ids: set[int] = set() # Products waiting in a queue, not yet marked as sent
+        self._posting_stopped = False # Set on shutdown, see stop_channel_workers
+        # Bot configuration settings, loaded in setup_hook (see apply_settings)
+        self.bot_settings: Optional[BotSettingsDataType] = None
+        # Casefolded channel names, computed once per settings load for the channel lookups
+        self._new_items_channel_needle: str = ""
+        self._welcome_channel_needle: str = ""
+        self._new_items_channel_id: Optional[int] = None # Resolved in on_ready, see get_new_items_channel
+        self._welcome_channel_by_guild: Dict[int, int] = {} # guild id -> welcome channel id
+        self._embed_color: discord.Color = discord.Color.from_rgb(*DEFAULT_EMBED_COLOR)
+        # Lowercased "<bot name>:" prefix checked by on_message, rebuilt when the bot name changes
+        self._bot_name: Optional[str] = None
+        self._bot_name_prefix: Optional[str] = None
+
+        # Joins waiting for a welcome as (member, is_returning), drained by welcome_worker
+        self._welcome_queue: asyncio.Queue[Tuple[discord.Member, bool]] = asyncio.Queue(maxsize=WELCOME_QUEUE_MAX_SIZE)
+        self._welcome_worker_task: Optional[asyncio.Task[None]] = None
+        self._known_users: OrderedDict[int, str] = OrderedDict() # LRU of user id -> username already in the database
+
+        # Welcome messages are preloaded in setup_hook and only reloaded when the file changes
+        self._welcome_messages_mtime: Optional[int] = None # st_mtime_ns of the loaded file
+        self._welcome_messages: Tuple[WelcomeMessage, ...] = ()
+        self._help_embed: Optional[discord.Embed] = None # Built in setup_hook
+
+
+    def apply_settings(self, bot_settings: BotSettingsDataType) -> None:
+        """Store the loaded settings and precompute the values derived from them."""
+        self.bot_settings = bot_settings
+        self._new_items_channel_needle = bot_settings['new_items_channel_name'].casefold()
+        self._welcome_channel_needle = bot_settings['welcome_channel_name'].casefold()
+        self._embed_color = self.load_embed_color()
 
 
     async def close_database(self) -> None:
@@ -68,13 +218,19 @@ class DiscordBot(commands.Bot):
         if self.user is None:
             return
 
-        bot_name: str = self.user.name.lower()
+        # Rebuild the cached prefix only when the bot account has been renamed
+        if self.user.name != self._bot_name:
+            self._bot_name = self.user.name
+            self._bot_name_prefix = f"{self._bot_name.lower()}:"
 
-        if message.content.lower().startswith(f'{bot_name}:'):
-            await message.channel.send(f"Hello {message.author.mention}! How can I help you today?")
+        # Only the prefix-sized slice is lowercased, not the whole message
+        content = message.content
+        bot_name_prefix = self._bot_name_prefix
+        if bot_name_prefix and content[:len(bot_name_prefix)].lower() == bot_name_prefix:
+            await self.send_with_retry(message.channel, content=f"Hello {message.author.mention}! How can I help you today?")
 
 
-        if message.content.lower().startswith("!help"):
+        if content[:len(HELP_COMMAND)].lower() == HELP_COMMAND:
             await self.show_help(message)
             return
 
@@ -94,18 +250,106 @@ class DiscordBot(commands.Bot):
 
         self.logger.info(f'Logged in as {self.user} (ID: {self.user.id})')
 
+        # Resolve the notification channel once so sends can use an id lookup
+        self.resolve_new_items_channel()
+
+
+    def resolve_new_items_channel(self) -> Optional[discord.TextChannel]:
+        """Search all channels for the new items channel and cache its id."""
+        channel_name = self._new_items_channel_needle
+        substring_match: Optional[discord.TextChannel] = None
+        new_items_channel: Optional[discord.TextChannel] = None
+        for guild in self.guilds:
+            for channel in guild.text_channels: # Text channels only, no isinstance check per channel
+                name = channel.name.casefold()
+                if name == channel_name:
+                    new_items_channel = channel # Exact name match wins
+                    break
+                if substring_match is None and channel_name in name:
+                    substring_match = channel
+            if new_items_channel is not None:
+                break
+
+        if new_items_channel is None:
+            new_items_channel = substring_match
+
+        self._new_items_channel_id = new_items_channel.id if new_items_channel else None
+        return new_items_channel
+
+
+    def get_new_items_channel(self) -> Optional[discord.TextChannel]:
+        """Return the new items channel from the cached id, resolving it when needed."""
+        if self._new_items_channel_id is not None:
+            channel = self.get_channel(self._new_items_channel_id)
+            if isinstance(channel, discord.TextChannel):
+                return channel
+        return self.resolve_new_items_channel()
+
+
+    def resolve_welcome_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """Search a guild for its welcome channel and cache the channel id per guild."""
+        for channel in guild.text_channels:
+            if self._welcome_channel_needle in channel.name.casefold():
+                self._welcome_channel_by_guild[guild.id] = channel.id
+                return channel
+
+        self._welcome_channel_by_guild.pop(guild.id, None)
+        return None
+
+
+    def get_welcome_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """Return the welcome channel of a guild from the cached id, resolving it when needed."""
+        channel_id = self._welcome_channel_by_guild.get(guild.id)
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, discord.TextChannel):
+                return channel
+        return self.resolve_welcome_channel(guild)
+
+
+    def invalidate_channel_cache(self, guild: discord.Guild) -> None:
+        """Forget resolved channel ids so the next lookup searches again."""
+        self._new_items_channel_id = None
+        self._welcome_channel_by_guild.pop(guild.id, None)
 
-    def get_embed_color(self) -> discord.Color:
-        """Fetch and validate embed color from bot settings."""
 
-        embed_color: List[int] = [214, 140, 184]
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        """Resolve the welcome channel once when a guild becomes available."""
+        self.resolve_welcome_channel(guild)
+
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        """A new channel may be a better name match than the cached one."""
+        self.invalidate_channel_cache(channel.guild)
+
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        """Renamed channels can change which channel matches the settings."""
+        if before.name != after.name:
+            self.invalidate_channel_cache(after.guild)
+
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        """Drop the cached id when the cached channel goes away."""
+        self.invalidate_channel_cache(channel.guild)
+
+
+    def load_embed_color(self) -> discord.Color:
+        """Validate the embed color from bot settings once per settings load."""
+
+        embed_color: List[int] = list(DEFAULT_EMBED_COLOR)
         if self.bot_settings:
             embed_color = self.bot_settings.get('embed_color', embed_color)
-        if len(embed_color) == 3:
+        if isinstance(embed_color, list) and len(embed_color) == 3:
             return discord.Color.from_rgb(*embed_color)
         else:
             self.logger.warning("Invalid embed color in configuration, using default muted pink.")
-            return discord.Color.from_rgb(214, 140, 184)  # Default color
+            return discord.Color.from_rgb(*DEFAULT_EMBED_COLOR)  # Default color
+
+
+    def get_embed_color(self) -> discord.Color:
+        """Return the embed color validated when the settings were loaded."""
+        return self._embed_color
 
 
     async def fetch_product_image(self, image_url: str) -> Optional[Tuple[bytes, str]]:
@@ -138,189 +382,417 @@ class DiscordBot(commands.Bot):
 
 
     async def send_new_items(self, store_name_format: str, unsent_products: List[ProductDataType], context: str) -> None:
-        """Send new products to a specific Discord channel."""
-        async with self.lock: # Ensure only one task can send messages at a time
-
-            new_items_channel = None # Channel to send new items
-
-            if not self.bot_settings:
-                self.logger.warning("Bot settings not found.")
-                return
-
-            if not unsent_products:
-                return
-
-            if not self.bot_settings.get("post_store_updates", True):
-                self.logger.info(f"Store update posting disabled. Marking {len(unsent_products)} {context} products as sent.")
-                for product in unsent_products:
-                    product_id = product.get("id") if product else None
-                    if product_id is None:
-                        self.logger.warning(f"Product ID is None for product: {product}, cannot mark product as sent")
-                        continue
-
-                    try:
-                        await self.store_manager.db.mark_product_as_sent(int(product_id))
-                    except (TypeError, ValueError) as e:
-                        self.logger.warning(f"Invalid product ID for product {product}: {e}")
-                return
-
-            # Channel cache is empty until the bot has logged in (startup tasks may get here first)
-            await self.wait_until_ready()
-
-            channel_name = self.bot_settings['new_items_channel_name'].lower()
-            substring_match = None
-            for channel in self.get_all_channels():
-                if not isinstance(channel, discord.TextChannel):
+        """Queue new products for the notification channel; posting happens in the channel worker."""
+        if self.bot_settings is None:
+            await self.wait_until_ready() # Settings are loaded in setup_hook, startup tasks may get here first
+
+        if not self.bot_settings:
+            self.logger.warning("Bot settings not found.")
+            return
+
+        if not unsent_products:
+            return
+
+        if not self.bot_settings.get("post_store_updates", True):
+            self.logger.info(f"Store update posting disabled. Marking {len(unsent_products)} {context} products as sent.")
+            for product in unsent_products:
+                product_id = product.get("id") if product else None
+                if product_id is None:
+                    self.logger.warning(f"Product ID is None for product: {product}, cannot mark product as sent")
                     continue
-                if channel.name.lower() == channel_name:
-                    new_items_channel = channel # Exact name match wins
-                    break
-                if substring_match is None and channel_name in channel.name.lower():
-                    substring_match = channel
 
-            if new_items_channel is None:
-                new_items_channel = substring_match
+                try:
+                    await self.store_manager.db.mark_product_as_sent(int(product_id))
+                except (TypeError, ValueError) as e:
+                    self.logger.warning(f"Invalid product ID for product {product}: {e}")
+            return
+
+        if self._posting_stopped: # Shutting down, the products stay unsent for the next start
+            return
 
-            if not new_items_channel:
-                self.logger.warning(f"Channel '{self.bot_settings['new_items_channel_name']}' not found.")
-                return
+        # Channel cache is empty until the bot has logged in (startup tasks may get here first)
+        await self.wait_until_ready()
 
-            self.logger.info(
-                f"Posting {len(unsent_products)} {context} products to "
-                f"#{new_items_channel.name} (guild: {new_items_channel.guild.name})"
-            )
+        new_items_channel = self.get_new_items_channel()
 
-            # Fetch and validate embed color from settings
-            embed_color: discord.Color = self.get_embed_color()
-
-            # if context is not "unsent" then it is context
-            title = f"Products from {store_name_format}!" if context == "unsent" else f'{context.capitalize()} products from {store_name_format}!'
-            description = f"Found {len(unsent_products)} items"
-            color = embed_color
-            # Create the embed message for section title
-            embed = discord.Embed(
-                title=title,
-                description=description,
-                color=color
-            )
+        if not new_items_channel:
+            self.logger.warning(f"Channel '{self.bot_settings['new_items_channel_name']}' not found.")
+            return
+
+        # Unsent products are re-read from the database on every run, skip the ones still queued
+        queued_products: List[ProductDataType] = []
+        for product in unsent_products:
+            product_id = product.get('id') if product else None
+            if product_id is not None and product_id in self._queued_product_ids:
+                continue
+            if product_id is not None:
+                self._queued_product_ids.add(product_id)
+            queued_products.append(product)
+
+        if not queued_products:
+            return
 
-            # Send section title
-            await new_items_channel.send(embed=embed)
-            await asyncio.sleep(0.5)
+        self.get_channel_queue(new_items_channel.id).put_nowait((store_name_format, queued_products, context))
 
-            # Send each product as a separate message
-            for product in unsent_products:
+
+    def get_channel_queue(self, channel_id: int) -> asyncio.Queue:
+        """Get (or create) the product queue of a channel and make sure its worker runs."""
+        if channel_id not in self._channel_queues:
+            self._channel_queues[channel_id] = asyncio.Queue()
+
+        worker = self._channel_workers.get(channel_id)
+        if worker is None or worker.done():
+            self._channel_workers[channel_id] = asyncio.create_task(self.channel_worker(channel_id, self._channel_queues[channel_id]))
+        return self._channel_queues[channel_id]
+
+
+    async def channel_worker(self, channel_id: int, queue: asyncio.Queue) -> None:
+        """Post queued product batches to one channel, one store batch at a time."""
+        while True:
+            store_name_format, products, context = await queue.get()
+            try:
+                channel = self.get_channel(channel_id)
+                if isinstance(channel, discord.TextChannel):
+                    await self.post_products(channel, store_name_format, products, context)
+                else:
+                    self.logger.warning(f"Channel {channel_id} is no longer available, {len(products)} products stay unsent.")
+            except Exception as e:
+                self.logger.error(f"An error occurred while posting products from {store_name_format}: {e}")
+            finally:
+                for product in products:
+                    self._queued_product_ids.discard(product.get('id'))
+                queue.task_done()
+
+
+    async def post_products(self, new_items_channel: discord.TextChannel, store_name_format: str,
+                            unsent_products: List[ProductDataType], context: str) -> None:
+        """Post a section title and the product embeds to the channel."""
+        self.logger.info(
+            f"Posting {len(unsent_products)} {context} products to "
+            f"#{new_items_channel.name} (guild: {new_items_channel.guild.name})"
+        )
+
+        # Fetch and validate embed color from settings
+        embed_color: discord.Color = self.get_embed_color()
+        batch_size, _ = self.get_product_batch_settings()
+
+        # if context is not "unsent" then it is context
+        title = f"Products from {store_name_format}!" if context == "unsent" else f'{context.capitalize()} products from {store_name_format}!'
+        description = f"Found {len(unsent_products)} items"
+        color = embed_color
+        # Create the embed message for section title
+        embed = discord.Embed(
+            title=title,
+            description=description,
+            color=color
+        )
+
+        # Send section title
+        await self.send_with_retry(new_items_channel, embed=embed)
+
+        # Pack several products into each message instead of one message per product
+        pending_embeds: List[discord.Embed] = []
+        pending_files: List[discord.File] = []
+        pending_ids: List[int] = []
+        pending_chars = 0
+        pending_bytes = 0
+        max_upload_bytes: int = new_items_channel.guild.filesize_limit
+
+        # Closed on the way out, so an error mid-post cancels the image downloads started ahead
+        async with contextlib.aclosing(self.iter_product_images(unsent_products)) as product_images:
+            async for product, fetched in product_images:
                 raw_product_id = product.get('id') if product else None
                 if raw_product_id is None:
                     self.logger.warning(f"Product ID is None for product: {product}, cannot send product")
                     continue
                 product_id = int(raw_product_id)
-                name: str = str(product.get('name', 'No name available'))
-                product_url: str = str(product.get('product_url', '#'))
-                raw_image_url = product.get('image_url')
-                image_url: Optional[str] = str(raw_image_url) if raw_image_url else None
-
-                raw_prices = product.get("prices", {})
-                prices: Dict[str, float] = {}
-                if isinstance(raw_prices, dict):
-                    # Ensure all values in the dictionary are floats
-                    for key, value in raw_prices.items():
-                        if isinstance(value, (int, float)):
-                            prices[key] = float(value)
-
-                price_text: List[str] = []
-                if prices.get('JPY') is not None:
-                    price_text.append(f"¥{prices['JPY']:,.0f}")
-                if prices.get('EUR') is not None:
-                    price_text.append(f"€{prices['EUR']:.2f}")
-
-
-                price_str = " / ".join(price_text) if price_text else "No price available"
-
-                embed = discord.Embed(
-                    title=name,
-                    description=f"💰 {price_str}\n🔗 [View product]({product_url})",
-                    color=embed_color
-                )
+                embed = build_product_embed(product, embed_color)
 
                 # Attach the image as a file; a direct embed URL is blocked by the CDN
                 image_file: Optional[discord.File] = None
-                if image_url:
-                    fetched = await self.fetch_product_image(image_url)
-                    if fetched:
-                        content, filename = fetched
-                        image_file = discord.File(BytesIO(content), filename=filename)
-                        embed.set_image(url=f"attachment://{filename}")
-
+                image_size = 0
+                if fetched:
+                    content, filename = fetched
+                    filename = f"{product_id}_{filename}" # Unique within a message carrying several images
+                    image_file = discord.File(BytesIO(content), filename=filename)
+                    image_size = len(content)
+                    embed.set_image(url=f"attachment://{filename}")
+
+                # Flush the pending message when this product would not fit into it
+                if pending_embeds and (
+                    len(pending_embeds) >= batch_size
+                    or pending_chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE
+                    or pending_bytes + image_size > max_upload_bytes
+                ):
+                    await self.send_product_batch(new_items_channel, pending_embeds, pending_files, pending_ids)
+                    pending_embeds, pending_files, pending_ids = [], [], []
+                    pending_chars = pending_bytes = 0
+
+                pending_embeds.append(embed)
+                pending_ids.append(product_id)
+                pending_chars += len(embed)
                 if image_file is not None:
-                    await new_items_channel.send(embed=embed, file=image_file)
-                else:
-                    await new_items_channel.send(embed=embed)
+                    pending_files.append(image_file)
+                    pending_bytes += image_size
+
+        if pending_embeds:
+            await self.send_product_batch(new_items_channel, pending_embeds, pending_files, pending_ids)
 
-                await self.store_manager.db.mark_product_as_sent(product_id)
-                # Wait 0.5 sec between messages
-                await asyncio.sleep(0.5)
+
+    async def iter_product_images(self, products: List[ProductDataType]
+                                  ) -> AsyncIterator[Tuple[ProductDataType, Optional[Tuple[bytes, str]]]]:
+        """Yield products in order with their images, downloading a few images ahead of the sends."""
+        pending: Deque[Tuple[ProductDataType, Optional[asyncio.Task]]] = deque()
+        try:
+            for product in products:
+                image_url = product.get('image_url') if product else None
+                fetch_task = asyncio.create_task(self.fetch_product_image(str(image_url))) if image_url else None
+                pending.append((product, fetch_task))
+                if len(pending) > IMAGE_PREFETCH_AHEAD:
+                    product, fetch_task = pending.popleft()
+                    yield product, await fetch_task if fetch_task else None
+
+            while pending:
+                product, fetch_task = pending.popleft()
+                yield product, await fetch_task if fetch_task else None
+        finally:
+            for _, fetch_task in pending: # Posting was interrupted, drop the downloads still running
+                if fetch_task:
+                    fetch_task.cancel()
+
+
+    async def send_with_retry(self, channel: discord.abc.Messageable, *, retries: int = SEND_MAX_RETRIES,
+                              **kwargs: Any) -> Optional[discord.Message]:
+        """Send a message paced per channel, retrying the connection errors discord.py does not retry itself."""
+        limiter = self.get_send_limiter(getattr(channel, 'id', 0))
+        for attempt in range(retries):
+            try:
+                await limiter.acquire()
+                return await channel.send(**kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == retries - 1:
+                    raise
+
+                delay = float(2 ** attempt)
+                self.logger.warning(f"Sending to Discord failed with {e!r}, retrying in {delay:.1f}s "
+                                    f"(attempt {attempt + 1}/{retries})")
+                await asyncio.sleep(delay)
+
+                # Attachments were consumed by the failed request
+                for file in kwargs.get('files') or []:
+                    file.reset()
+        return None
+
+
+    def get_send_limiter(self, channel_id: int) -> TokenBucket:
+        """Get (or create) the token bucket that paces messages to a channel."""
+        limiter = self._send_limiters.get(channel_id)
+        if limiter is None:
+            _, send_interval = self.get_product_batch_settings()
+            limiter = self._send_limiters[channel_id] = TokenBucket(CHANNEL_SEND_BURST, send_interval)
+        return limiter
+
+
+    async def send_product_batch(self, channel: discord.TextChannel, embeds: List[discord.Embed],
+                                 files: List[discord.File], product_ids: List[int]) -> None:
+        """Send one message with several product embeds and mark those products as sent."""
+        await self.send_with_retry(channel, embeds=embeds, files=files)
+        for product_id in product_ids:
+            await self.store_manager.db.mark_product_as_sent(product_id)
+
+
+    def get_product_batch_settings(self) -> Tuple[int, float]:
+        """Return how many products go into one message and the average spacing between messages."""
+        batch_size = DEFAULT_PRODUCT_BATCH_SIZE
+        batch_interval = DEFAULT_PRODUCT_BATCH_INTERVAL_SECONDS
+        if self.bot_settings:
+            batch_size = self.bot_settings.get('product_batch_size', batch_size)
+            batch_interval = self.bot_settings.get('product_batch_interval_seconds', batch_interval)
+        # Discord accepts at most 10 embeds per message
+        return max(1, min(int(batch_size), MAX_EMBEDS_PER_MESSAGE)), max(0.0, float(batch_interval))
 
 
-    async def load_welcome_messages(self) -> List[str]:
-        """Methdod to load welcome messages from a text file."""
+    async def read_welcome_messages(self) -> Tuple[WelcomeMessage, ...]:
+        """Read and precompile welcome messages from the text file and remember its modification time."""
         try:
-            with open(WELCOME_MESSAGES_FILE_PATH, 'r', encoding='utf-8') as file:
-                return [line.strip() for line in file if line.strip()] # Returns a list of non-empty lines
+            self._welcome_messages_mtime = (await aiofiles.os.stat(WELCOME_MESSAGES_FILE_PATH)).st_mtime_ns
+            async with aiofiles.open(WELCOME_MESSAGES_FILE_PATH, 'r', encoding='utf-8') as file:
+                content = await file.read()
+
+            welcome_messages: List[WelcomeMessage] = []
+            for line in filter(None, map(str.strip, content.splitlines())): # Non-empty lines only
+                welcome_message = compile_welcome_message(line)
+                if welcome_message is None:
+                    self.logger.warning(f"Skipping welcome message with an invalid placeholder: {line}")
+                    continue
+                welcome_messages.append(welcome_message)
+            return tuple(welcome_messages)
         except FileNotFoundError:
             self.logger.error(f"Welcome messages file not found: {WELCOME_MESSAGES_FILE_PATH}")
-            return []
+            return ()
         except Exception as e:
             self.logger.error(f"An error occurred while loading welcome messages: {e}")
-            return []
+            return ()
+
+
+    async def load_welcome_messages(self) -> Tuple[WelcomeMessage, ...]:
+        """Return the cached welcome messages, re-reading the file only when it has changed."""
+        try:
+            mtime: Optional[int] = (await aiofiles.os.stat(WELCOME_MESSAGES_FILE_PATH)).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime != self._welcome_messages_mtime:
+            self._welcome_messages = await self.read_welcome_messages()
+        return self._welcome_messages
+
+
+    async def setup_hook(self) -> None:
+        """Load the config files and start background workers once the bot has an event loop."""
+        bot_settings, self._welcome_messages = await asyncio.gather(
+            load_settings(SETTINGS_FILE_PATH),
+            self.read_welcome_messages(),
+        )
+        self.apply_settings(bot_settings)
+        self._help_embed = self.build_help_embed() # Needs the embed color from the settings
+        self._welcome_worker_task = asyncio.create_task(self.welcome_worker())
+
+
+    async def stop_channel_workers(self) -> None:
+        """Let the channel workers finish the queued posts, then stop them, before the store database closes."""
+        self._posting_stopped = True
+        drains = [asyncio.create_task(queue.join()) for queue in self._channel_queues.values()]
+        if drains:
+            _, pending = await asyncio.wait(drains, timeout=CHANNEL_DRAIN_TIMEOUT_SECONDS)
+            for drain in pending:
+                drain.cancel()
+            if pending:
+                self.logger.warning(f"Product posts did not finish within {CHANNEL_DRAIN_TIMEOUT_SECONDS} seconds, the rest stay unsent.")
+
+        for worker in self._channel_workers.values():
+            if not worker.done():
+                worker.cancel()
+                try:
+                    await worker
+                except asyncio.CancelledError:
+                    pass
+
+
+    async def close(self) -> None:
+        """Stop background workers before closing the Discord connection."""
+        workers = [*self._channel_workers.values(), self._welcome_worker_task]
+        for worker in workers:
+            if worker is not None and not worker.done():
+                worker.cancel()
+                try:
+                    await worker
+                except asyncio.CancelledError:
+                    pass
+        await super().close()
 
 
     async def on_member_join(self, member: discord.Member) -> None:
-        """Send a welcome message when a new member joins the server."""
-        guild = member.guild
-        welcome_channel = None
+        """Queue a welcome message when a new member joins the server."""
+        if self._known_users.get(member.id) == member.name:
+            self._known_users.move_to_end(member.id)
+            is_returning = True # Seen recently with the same name, nothing to update
+        else:
+            inserted = await self.discord_db.upsert_user(member.id, member.name) # Add the user or refresh the username
+            is_returning = inserted is False
+            if inserted is not None:
+                self.remember_user(member.id, member.name)
 
-        user: Optional[DiscordUserDataType] = await self.discord_db.get_user(member.id, member.name) # Check if user is already in the database
+        try:
+            self._welcome_queue.put_nowait((member, is_returning))
+        except asyncio.QueueFull:
+            self.logger.warning(f"Welcome queue is full, skipping welcome message for {member.name}")
 
-        if not user:
-            await self.discord_db.add_user(member.id, member.name) # Add user to the database if not found
 
-        # Load welcome messages list from the file
-        welcome_messages = await self.load_welcome_messages()
+    def remember_user(self, user_id: int, username: str) -> None:
+        """Remember a user known to the database, evicting the least recently seen one when full."""
+        self._known_users[user_id] = username
+        self._known_users.move_to_end(user_id)
+        if len(self._known_users) > KNOWN_USERS_CACHE_SIZE:
+            self._known_users.popitem(last=False)
 
-        if not welcome_messages or len(welcome_messages) == 0:
-            self.logger.warning("No welcome messages found from the file.")
-            welcome_messages = [f"Welcome to the Jirai Sweeties server, {member.mention}! We're glad to have you here!"]
 
+    def get_welcome_batch_settings(self) -> Tuple[float, int]:
+        """Return how long joins are collected and how many members one welcome covers."""
+        batch_window = DEFAULT_WELCOME_BATCH_WINDOW_SECONDS
+        max_batch = DEFAULT_WELCOME_MAX_BATCH
+        if self.bot_settings:
+            batch_window = self.bot_settings.get('welcome_batch_window_seconds', batch_window)
+            max_batch = self.bot_settings.get('welcome_max_batch', max_batch)
+        return max(0.0, float(batch_window)), max(1, int(max_batch))
+
+
+    async def welcome_worker(self) -> None:
+        """Send queued welcomes, coalescing members who join within the batch window."""
+        while True:
+            first_join = await self._welcome_queue.get()
+            batch_window, max_batch = self.get_welcome_batch_settings()
+            await asyncio.sleep(batch_window) # Give the member a moment and let a burst of joins gather
+
+            joins = [first_join]
+            while len(joins) < max_batch and not self._welcome_queue.empty():
+                joins.append(self._welcome_queue.get_nowait())
+
+            # Group the members per guild, keeping new and returning members apart
+            guilds: Dict[int, Tuple[discord.Guild, List[discord.Member], List[discord.Member]]] = {}
+            for member, is_returning in joins:
+                _, new_members, returning_members = guilds.setdefault(member.guild.id, (member.guild, [], []))
+                (returning_members if is_returning else new_members).append(member)
+
+            for guild, new_members, returning_members in guilds.values():
+                try:
+                    await self.send_welcome_messages(guild, new_members, returning_members)
+                except Exception as e:
+                    self.logger.error(f"An error occurred while sending a welcome message: {e}")
+
+
+    async def send_welcome_messages(self, guild: discord.Guild, new_members: List[discord.Member],
+                                    returning_members: List[discord.Member]) -> None:
+        """Send one welcome message for new members and one for returning members of a guild."""
         if not self.bot_settings:
             self.logger.warning("Bot settings not found.")
             return
 
-        for channel in guild.text_channels:
-            if self.bot_settings["welcome_channel_name"].lower() in channel.name.lower():
-                welcome_channel = channel
-                break
-
-        if welcome_channel:
-            try:
-                if user: # In case of returning user
-                    await welcome_channel.send(f"Welcome back, {member.mention}! We're glad to see you again!")
-                    return
-                # Select a random welcome message and format it with the member mention
-                base_message = random.choice(welcome_messages)
-                welcome_message = base_message.format(member=member.mention)
-                await asyncio.sleep(3)
-                await welcome_channel.send(welcome_message)
-            except discord.Forbidden:
-                self.logger.warning(f"Bot does not have permission to send messages in the channel: {welcome_channel.name}")
-            except Exception as e:
-                self.logger.error(f"An error occurred while sending a welcome message: {e}")
-        else:
+        welcome_channel = self.get_welcome_channel(guild)
+        if not welcome_channel:
             self.logger.warning("Welcome channel not found.")
+            return
+
+        try:
+            if returning_members: # In case of returning users
+                mentions = ", ".join(member.mention for member in returning_members)
+                await self.send_with_retry(welcome_channel, content=f"Welcome back, {mentions}! We're glad to see you again!")
+
+            if new_members:
+                mentions = ", ".join(member.mention for member in new_members)
+
+                # Cached, precompiled welcome messages, refreshed if the file was edited
+                welcome_messages = await self.load_welcome_messages()
+
+                if not welcome_messages:
+                    self.logger.warning("No welcome messages found from the file.")
+                    welcome_messages = (FALLBACK_WELCOME_MESSAGE,)
+
+                # Select a random welcome message and put the member mentions between its literal parts
+                welcome_message = mentions.join(random.choice(welcome_messages))
+                await self.send_with_retry(welcome_channel, content=welcome_message)
+        except discord.Forbidden:
+            self.logger.warning(f"Bot does not have permission to send messages in the channel: {welcome_channel.name}")
 
 
     async def show_help(self, message: discord.Message) -> None:
         """Send a detailed help message to the user with commands and bot features."""
+        if self._help_embed is None:
+            self._help_embed = self.build_help_embed()
+        await self.send_with_retry(message.channel, embed=self._help_embed)
+
+
+    def build_help_embed(self) -> discord.Embed:
+        """Build the static help embed, done once since its content never changes."""
 
         # Fetch and validate embed color from settings
         embed_color = self.get_embed_color()
@@ -368,5 +840,4 @@ class DiscordBot(commands.Bot):
         # Add final note to the embed
         embed.set_footer(text="More commands and features coming soon! Stay tuned and send your suggestions to the suggestions channel. 💖")
 
-        # Send the embed as a message
-        await message.channel.send(embed=embed)
+        return embed
@@ -1,14 +1,13 @@
-from sqlite3 import connect, Error, Row
+from sqlite3 import connect, Error
 import os
-from datetime import datetime
 import asyncio
 import sys
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__))) # Add the project root directory to the path
 from utils.helpers import ensure_directory_exists
-from bot.discord_types import DiscordUserDataType
 
 # Get to the root directory
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..')) # Root project directory
@@ -18,17 +17,19 @@ ensure_directory_exists(DATA_DIR)  # Ensure that the data directory exists
 
 SQLITE_DISCORD_DB_FILE = os.path.join(DATA_DIR, "discord_db.sqlite")  # SQLite database file
 
+T = TypeVar("T")
+
 class DiscordDatabase:
     """Manage the bot database."""
     def __init__(self) -> None:
         self.logger = logging.getLogger("BotDatabase")
         self.store_db_file_path = SQLITE_DISCORD_DB_FILE
         self.db_name = "Discord Database"
-        self.db_lock = asyncio.Lock()
+        # A single worker thread runs every query, so they never block the event loop and stay serialized
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="discord-db")
 
         try:
-            self.conn = connect(self.store_db_file_path, isolation_level=None, timeout=30.0)
-            self.conn.row_factory = Row
+            self.conn = connect(self.store_db_file_path, isolation_level=None, check_same_thread=False, timeout=30.0)
             self.cursor = self.conn.cursor()
             self.init_database()
         except Error as e:
@@ -39,7 +40,12 @@ class DiscordDatabase:
         """Initialize the database."""
         try:
             self.logger.info(f"Initializing database {self.db_name}...")
-            self.cursor.execute("PRAGMA journal_mode=WAL;")
+            journal_mode = self.cursor.execute("PRAGMA journal_mode=WAL;").fetchone()[0]
+            if journal_mode != "wal":
+                self.logger.warning(f"WAL mode not available for {self.db_name}, using {journal_mode}")
+            self.cursor.execute("PRAGMA synchronous=NORMAL;") # WAL keeps this crash safe, fsync only at checkpoints
+            self.cursor.execute("PRAGMA temp_store=MEMORY;")
+            self.cursor.execute("PRAGMA cache_size=-2000;") # 2 MB page cache, the Users table is small
             self.cursor.execute("""
                 CREATE TABLE IF NOT EXISTS Users (
                     id INTEGER PRIMARY KEY NOT NULL,
@@ -60,51 +66,39 @@ class DiscordDatabase:
         """Close the database connection."""
         self.logger.info("Closing database connection...")
         if self.conn:
-            self.conn.close()
+            await self.run_in_db_thread(self.conn.close) # Queued behind any running query
+        self.executor.shutdown(wait=False)
 
 
-    async def add_user(self, user_id: int, username: str) -> None:
-        """Add a user to the database."""
-        try:
-            self.logger.info(f"Adding user {username} to the database...")
-            self.cursor.execute("""
-                INSERT OR IGNORE INTO Users (id, username, created_at) VALUES (?, ?, ?)
-                """, (user_id, username, datetime.now()))
-            self.conn.commit()
-            self.logger.info(f"User {username} ({user_id}) added to the database.")
+    async def run_in_db_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking database call on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
 
-        except Error as e:
-            self.logger.error(f"Failed to add user {username} to the database: {e}")
-            self.conn.rollback()
-            return
+
+    async def upsert_user(self, user_id: int, username: str) -> Optional[bool]:
+        """Add a user or refresh their username without blocking the event loop."""
+        return await self.run_in_db_thread(self.upsert_user_sync, user_id, username)
 
 
-    async def get_user(self, user_id: int, username: str) -> Optional[DiscordUserDataType]:
-        """Get a user from the database."""
+    def upsert_user_sync(self, user_id: int, username: str) -> Optional[bool]:
+        """Add a user or refresh their username. Returns True for a new user, False for a known one."""
         try:
-            self.logger.info(f"Getting user {user_id} from the database...")
-            row: Optional[Row] = self.cursor.execute("""
-                SELECT * FROM Users WHERE id = ?
-                """, (user_id,)).fetchone()
-
-            if not row:
-                self.logger.info(f"User {user_id} not found in the database.")
-                return None
-
-            # sqlite3.Row is immutable, so work on a plain dict copy
-            user_dict: DiscordUserDataType = dict(row)
-
-            # Update username if it has changed
-            if user_dict["username"] != username:
-                self.logger.info(f"Updating username for user {user_id} in the database...")
-                self.cursor.execute("""
-                    UPDATE Users SET username = ? WHERE id = ?
-                    """, (username, user_id))
-                self.conn.commit()
-                user_dict["username"] = username
-
-            self.logger.info(f"User {user_id} retrieved from the database.")
-            return user_dict
+            self.cursor.execute("""
+                INSERT INTO Users (id, username) VALUES (?, ?)
+                ON CONFLICT(id) DO NOTHING
+                """, (user_id, username))
+            if self.cursor.rowcount == 1:
+                self.logger.info(f"User {username} ({user_id}) added to the database.")
+                return True
+
+            # Known user, only touch the row when the username has changed
+            self.cursor.execute("""
+                UPDATE Users SET username = ? WHERE id = ? AND username != ?
+                """, (username, user_id, username))
+            if self.cursor.rowcount == 1:
+                self.logger.info(f"Username for user {user_id} updated in the database.")
+            return False
+
         except Error as e:
-            self.logger.error(f"Failed to get user {user_id} from the database: {e}")
+            self.logger.error(f"Failed to add or update user {username} in the database: {e}")
             return None
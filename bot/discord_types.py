@@ -4,7 +4,11 @@ class BotSettingsDataType(TypedDict):
     embed_color: List[int]
     new_items_channel_name: str
     post_store_updates: NotRequired[bool]
+    product_batch_size: NotRequired[int]
+    product_batch_interval_seconds: NotRequired[float]
     welcome_channel_name: str
+    welcome_batch_window_seconds: NotRequired[float]
+    welcome_max_batch: NotRequired[int]
 
 
 class DiscordUserDataType(TypedDict):
@@ -18,7 +18,8 @@ logger: logging.Logger = logging.getLogger("Main")
 store_manager: Optional[StoreManager] = None
 bot: Optional[DiscordBot] = None
 shutdown_event = asyncio.Event()
-shutdown_started = False
+shutdown_started = False # graceful_shutdown runs once, whether from the signal path or the finally block
+TASK_CANCEL_TIMEOUT_SECONDS = 5.0
 
 # Load .env file
 load_dotenv()
@@ -37,6 +38,11 @@ async def graceful_shutdown():
     if not shutdown_event.is_set():
         shutdown_event.set()
 
+    if bot:
+        # Queued product posts mark products as sent, so they have to finish before the store database closes
+        logger.info("Stopping product posting...")
+        await bot.stop_channel_workers()
+
     if store_manager:
         logger.info("Shutting down StoreManager...")
         await store_manager.graceful_shutdown()
@@ -47,6 +53,19 @@ async def graceful_shutdown():
         await bot.close()
         logger.info("Discord bot closed")
 
+async def cancel_and_wait(task: Optional[Task[None]], name: str) -> None:
+    """Cancel a task and wait for it to unwind, but never hang shutdown on it."""
+    if task is None or task.done():
+        return
+
+    task.cancel()
+    # asyncio.wait does not cancel again on timeout, so a task stuck in cleanup cannot hang shutdown
+    done, _ = await asyncio.wait({task}, timeout=TASK_CANCEL_TIMEOUT_SECONDS)
+    if not done:
+        logger.warning(f"The {name} task did not stop within {TASK_CANCEL_TIMEOUT_SECONDS} seconds.")
+    elif not task.cancelled() and task.exception() is not None:
+        logger.error(f"The {name} task failed while stopping: {task.exception()}")
+
 def signal_handler(signum, frame):
     """Handle termination signals by scheduling async handler."""
     logger.info(f"Received signal {signum}")
@@ -110,19 +129,8 @@ async def main_run() -> None:
         if shutdown_task is not None and not shutdown_task.done():
             shutdown_task.cancel()
 
-        if bot_task is not None and not bot_task.done():
-            bot_task.cancel()
-            try:
-                await bot_task
-            except asyncio.CancelledError:
-                pass
-
-        if store_task is not None and not store_task.done():
-            store_task.cancel()
-            try:
-                await store_task
-            except asyncio.CancelledError:
-                pass
+        await cancel_and_wait(bot_task, "bot")
+        await cancel_and_wait(store_task, "store manager")
 
         if bot is not None:
             await bot.close_database()
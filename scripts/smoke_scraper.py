@@ -4,7 +4,6 @@ import asyncio
 import json
 import sys
 
-import aiohttp
 from lxml import html
 
 
@@ -12,6 +11,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_ROOT))
 
 from store_data_extractor.src.data_extractor import (  # noqa: E402
+    create_client_session,
     extract_items_by_config,
     get_body_element,
     get_page_content,
@@ -40,14 +40,14 @@ async def run_smoke(store_name: str | None) -> None:
     store = load_store(store_name)
     options = store["options"]
 
-    async with aiohttp.ClientSession() as session:
+    async with create_client_session() as session:
         content = await get_page_content(options["base_url"], session, options)
 
     if not content:
         raise RuntimeError(f"No content fetched for {store['name']}")
 
     body = get_body_element(html.fromstring(content))
-    items = await extract_items_by_config(body, options)
+    items = extract_items_by_config(body, options)
     if not items:
         raise RuntimeError(f"No items parsed for {store['name']}")
 
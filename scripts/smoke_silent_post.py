@@ -22,7 +22,6 @@ class FakeStoreDatabase:
 async def run_smoke() -> None:
     fake_db = FakeStoreDatabase()
     bot = object.__new__(DiscordBot)
-    bot.lock = asyncio.Lock()
     bot.bot_settings = {
         "new_items_channel_name": "developer",
         "post_store_updates": False,
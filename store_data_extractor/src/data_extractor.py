@@ -1,34 +1,112 @@
-from typing import List, Optional, Any, Tuple
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from collections import OrderedDict
+import functools
 import random
-from lxml import html
-from lxml.etree import XPathError
+from lxml import etree, html
+from lxml.cssselect import CSSSelector
+from lxml.etree import XPathError, XPathEvalError
 from datetime import datetime
-from aiohttp import ClientResponseError, ClientSession
+from aiohttp import ClientResponseError, ClientSession, TCPConnector
 from charset_normalizer import from_bytes
 from curl_cffi import requests as curl_requests
-from urllib.parse import urljoin
+from urllib.parse import parse_qsl, urljoin, urlparse
 import certifi
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import ssl
 import logging
 import re
 from store_data_extractor.src.store_database import StoreDatabase
 from store_data_extractor.src.user_agent_manager import next_user_agent
-from store_data_extractor.store_types import StoreConfigDataType, StoreOptionsDataType, ProductDataType, ProductPricesDataType
+from store_data_extractor.store_types import CachedPageDataType, StoreConfigDataType, StoreOptionsDataType, ProductDataType, ProductPricesDataType
+from utils.rate_limiter import TokenBucket
 
 logger = logging.getLogger("DataExtractor")
 
+# (currency, selector, number pattern, divisor) for one configured price
+PricePlanEntry = Tuple[str, str, re.Pattern, int]
+
+# SSL context with the certifi CA bundle, built once and shared through the session connector
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+# Connection pool of the shared session: keep-alive across pages, different stores fetch in parallel
+SESSION_CONNECTION_LIMIT = 32
+SESSION_CONNECTIONS_PER_HOST = 2
+
+# Encoding detection only looks at the start of the page
+ENCODING_DETECTION_SAMPLE_BYTES = 64 * 1024
+
+# Encodings found by detection, per host, tried on that host's next pages when the configured one fails
+detected_encodings: Dict[str, str] = {}
+
+# Request pacing per host, shared by every store that fetches from the same site
+host_limiters: Dict[str, TokenBucket] = {}
+
+# Page parsing runs off the event loop, on one thread so the compiled selectors are never used concurrently
+page_parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-parser")
+
+# Retry backoff: the first wait is 0.5-1 seconds, doubling after every failed attempt
+RETRY_BASE_DELAY_SECONDS = 0.5
+
+# Client errors that may go away on their own, every other 4xx is not worth retrying
+RETRYABLE_CLIENT_STATUSES = frozenset({408, 425, 429})
+
+# Validators from the last response of each page URL, waiting until the page has been processed
+response_validators: OrderedDict[str, Tuple[Optional[str], Optional[str]]] = OrderedDict()
+
+# LRU of processed pages that sent validators, revalidated with a conditional request on the next run
+cached_pages: OrderedDict[str, CachedPageDataType] = OrderedDict()
+
+# Upper bound for both page caches, the least recently used pages are dropped first
+PAGE_CACHE_SIZE = 5000
+
+# Text match for next page links, evaluated inside lxml instead of building each link's text in Python
+CONTAINS_TEXT_XPATH = etree.XPath("contains(string(.), $text)")
+
+# Price number patterns, compiled once
+JPY_PRICE_PATTERN = re.compile(r"[\d,]+")
+EUR_PRICE_PATTERN = re.compile(r"[\d.,]+")
+
+class FatalFetchError(Exception):
+    """The server refused the page in a way that retrying will not fix."""
+    def __init__(self, url: str, status: int) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+class PageNotModified(Exception):
+    """The server answered 304, the page is the same as on the last run."""
+
+def is_fatal_status(status: int) -> bool:
+    return 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUSES
+
+def create_client_session() -> ClientSession:
+    """Create the HTTP session shared by all store fetches, must be called inside the event loop."""
+    connector = TCPConnector(
+        limit=SESSION_CONNECTION_LIMIT,
+        limit_per_host=SESSION_CONNECTIONS_PER_HOST, # Stay polite towards a single store
+        ssl=SSL_CONTEXT,
+        ttl_dns_cache=300,
+    )
+    return ClientSession(connector=connector)
+
 async def get_page_content(url: str, session: Any, store: StoreOptionsDataType) -> Optional[str]:
     """Fetch the HTML content of a page using a rotating user agent."""
     agent: str = await next_user_agent()
     logger.info(f"Fetching page {url} with user agent: {agent}")
 
     headers = build_request_headers(agent, store)
+    headers.update(build_conditional_headers(url))
     fetch_backend = store.get("fetch_backend", "auto")
 
-    if fetch_backend in ("auto", "aiohttp"):
-        content = await get_page_content_with_aiohttp(url, session, store, headers)
-        if content or fetch_backend == "aiohttp":
+    if fetch_backend == "aiohttp":
+        return await get_page_content_with_aiohttp(url, session, store, headers)
+
+    if fetch_backend == "auto":
+        try:
+            content = await get_page_content_with_aiohttp(url, session, store, headers)
+        except FatalFetchError:
+            content = None # curl_cffi may still get through, e.g. a 403 from bot protection
+        if content:
             return content
 
     if fetch_backend in ("auto", "curl_cffi"):
@@ -44,14 +122,20 @@ async def get_page_content_with_aiohttp(
     headers: dict[str, str],
 ) -> Optional[str]:
     try:
-        context = ssl.create_default_context(cafile=certifi.where())
         proxy_url = store.get("proxy_url")
 
-        async with session.get(url, headers=headers, proxy=proxy_url, ssl=context) as response:
+        async with session.get(url, headers=headers, proxy=proxy_url) as response:
             response.raise_for_status()
-            return decode_page_content(await response.read(), store)
+            if response.status == 304:
+                raise PageNotModified(url)
+            remember_validators(url, response.headers)
+            return decode_page_content(await response.read(), store, url)
+    except PageNotModified:
+        raise
     except ClientResponseError as e:
         logger.warning(f"aiohttp fetch failed for {url}: {e.status}, message='{e.message}'")
+        if is_fatal_status(e.status):
+            raise FatalFetchError(url, e.status) from e
     except Exception as e:
         logger.warning(f"aiohttp fetch failed for {url}: {e}")
 
@@ -64,6 +148,8 @@ async def get_page_content_with_curl_cffi(
 ) -> Optional[str]:
     try:
         return await asyncio.to_thread(fetch_page_with_curl_cffi, url, store, headers)
+    except (FatalFetchError, PageNotModified):
+        raise
     except Exception as e:
         logger.error(f"curl_cffi fetch failed for {url}: {e}")
         return None
@@ -79,22 +165,82 @@ def fetch_page_with_curl_cffi(url: str, store: StoreOptionsDataType, headers: di
 
     if response.status_code >= 400:
         logger.error(f"curl_cffi fetch failed for {url}: HTTP {response.status_code}")
+        if is_fatal_status(response.status_code):
+            raise FatalFetchError(url, response.status_code)
         return None
 
-    return decode_page_content(response.content, store)
-
-def decode_page_content(raw_content: bytes, store: StoreOptionsDataType) -> str:
-    encoding = store.get("encoding", "utf-8")
+    if response.status_code == 304:
+        raise PageNotModified(url)
+    remember_validators(url, response.headers)
+    return decode_page_content(response.content, store, url)
+
+def build_conditional_headers(url: str) -> dict[str, str]:
+    """Ask the server to answer 304 if the page has not changed since it was last processed."""
+    cached_page = cached_pages.get(url)
+    if cached_page is None:
+        return {}
+
+    cached_pages.move_to_end(url)
+    headers = {}
+    if cached_page["etag"]:
+        headers["If-None-Match"] = cached_page["etag"]
+    if cached_page["last_modified"]:
+        headers["If-Modified-Since"] = cached_page["last_modified"]
+    return headers
 
-    try:
-        return raw_content.decode(encoding)
-    except Exception as e:
-        logger.warning(f"Failed to decode using specified encoding. Attempting automatic encoding detection: {e}")
+def remember_validators(url: str, response_headers: Any) -> None:
+    etag = response_headers.get("ETag")
+    last_modified = response_headers.get("Last-Modified")
+    if etag or last_modified:
+        response_validators[url] = (etag, last_modified)
+        response_validators.move_to_end(url)
+        if len(response_validators) > PAGE_CACHE_SIZE:
+            response_validators.popitem(last=False)
+    else:
+        response_validators.pop(url, None)
+
+def remember_page(url: str, product_urls: List[str], next_url: Optional[str]) -> None:
+    """Cache a processed page's results under the validators it was fetched with."""
+    validators = response_validators.pop(url, None)
+    if validators is None:
+        cached_pages.pop(url, None)
+        return
+
+    etag, last_modified = validators
+    cached_pages[url] = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "product_urls": product_urls,
+        "next_url": next_url,
+    }
+    cached_pages.move_to_end(url)
+    if len(cached_pages) > PAGE_CACHE_SIZE:
+        cached_pages.popitem(last=False)
+
+def forget_page(url: str) -> None:
+    """Drop a page whose products were not saved, so the next run fetches it in full."""
+    response_validators.pop(url, None)
+    cached_pages.pop(url, None)
+
+def decode_page_content(raw_content: bytes, store: StoreOptionsDataType, url: str) -> str:
+    host = urlparse(url).netloc
+    encodings = [store.get("encoding", "utf-8")]
+    if host in detected_encodings: # Detected earlier for this host, tried before detecting again
+        # Only after the configured encoding: a single-byte codec decodes anything and would hide mojibake
+        encodings.append(detected_encodings[host])
+
+    for encoding in encodings:
+        try:
+            return raw_content.decode(encoding)
+        except Exception as e:
+            logger.warning(f"Failed to decode using {encoding}: {e}")
 
-    detected = from_bytes(raw_content).best()
+    logger.warning("Attempting automatic encoding detection.")
+    detected = from_bytes(raw_content[:ENCODING_DETECTION_SAMPLE_BYTES]).best() # A sample is enough for the statistics
     if detected:
-        logger.info(f"Detected encoding: {detected.encoding}")
-        return str(detected)
+        logger.info(f"Detected encoding for {host}: {detected.encoding}")
+        detected_encodings[host] = detected.encoding
+        return raw_content.decode(detected.encoding, errors="replace")
 
     logger.error("Failed to detect encoding. Returning raw content as UTF-8 with errors ignored.")
     return raw_content.decode("utf-8", errors="ignore")
@@ -117,57 +263,121 @@ def build_request_headers(agent: str, store: StoreOptionsDataType) -> dict[str,
 
 
 async def try_get_page_content(url: str, session: Any, store: StoreOptionsDataType, max_retries: int = 3) -> Optional[str]:
-    """Try to get page content with retries."""
+    """Try to get page content with retries, backing off exponentially with jitter."""
+    limiter = get_host_limiter(url, store)
+    delay = RETRY_BASE_DELAY_SECONDS
     for attempt in range(max_retries):
+        await limiter.acquire() # Retries wait for the host's turn too
         try:
             content = await get_page_content(url, session, store)
             if content:
                 return content
             logger.warning(f"Attempt {attempt + 1}/{max_retries} failed to get content from {url}")
+        except FatalFetchError as e:
+            logger.error(f"Not retrying {url}: {e}")
+            return None
+        except PageNotModified:
+            raise
         except Exception as e:
             logger.warning(f"Attempt {attempt + 1}/{max_retries} failed with error: {e}")
 
         if attempt < max_retries - 1:
-            await asyncio.sleep(5)  # Wait before retrying
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            delay *= 2
 
     return None
 
-def parse_prices(price_text: str, price_config) -> ProductPricesDataType:
-    """Parse price information from the price string."""
-    prices: ProductPricesDataType = {}
+def get_host_limiter(url: str, store: StoreOptionsDataType) -> TokenBucket:
+    """Return the limiter of the url's host, spacing requests by the longest configured delay."""
+    host = urlparse(url).netloc.lower()
+    delay = store.get("delay_between_requests", 5)
+    limiter = host_limiters.get(host)
+    if limiter is None:
+        limiter = host_limiters[host] = TokenBucket(1, delay)
+    elif delay > limiter.interval:
+        limiter.interval = delay
+    return limiter
+
+async def fetch_page_politely(url: str, session: Any, store: StoreOptionsDataType) -> Optional[str]:
+    """Wait a small jitter, then fetch the page with retries, each attempt paced by the host's limiter."""
+    await asyncio.sleep(random.uniform(0, 2))
+    return await try_get_page_content(url, session, store)
+
+def build_price_plan(config: StoreOptionsDataType) -> List[PricePlanEntry]:
+    """Resolve the price selectors once per page into (currency, selector, pattern, divisor) entries."""
+    price_plan: List[PricePlanEntry] = []
+    for price_config in config.get("item_price_selectors", []):
+        currency = price_config["currency"]
+        if currency == "JPY":
+            price_plan.append((currency, price_config["selector"], JPY_PRICE_PATTERN, 1))
+        elif currency == "EUR":
+            price_plan.append((currency, price_config["selector"], EUR_PRICE_PATTERN, 100)) # Cents without separators
+    return price_plan
+
+def parse_price(price_text: str, pattern: re.Pattern, divisor: int) -> Optional[float]:
+    """Parse one price from the price string."""
     try:
-        price_text = price_text.strip()
-        if price_config["currency"] == "JPY":
-            match = re.search(r"[\d,]+", price_text)
-            if match:
-                cleaned_price = match.group(0).replace(",", "")
-                prices["JPY"] = float(cleaned_price)
-        elif price_config["currency"] == "EUR":
-            match = re.search(r"[\d.,]+", price_text)
-            if match:
-                cleaned_price = match.group(0).replace(",", "").replace(".", "")
-                prices["EUR"] = float(cleaned_price) / 100
+        match = pattern.search(price_text)
+        if match:
+            cleaned_price = match.group(0).replace(",", "").replace(".", "")
+            return float(cleaned_price) / divisor
     except Exception as e:
         logger.error(f"Error parsing price: {e}")
 
-    return prices
+    return None
 
-def select_values(node: Any, selector: str) -> List[Any]:
-    """Evaluate a selector as XPath by default, with CSS support for store configs."""
+css_fallback_selectors: set[str] = set() # Unprefixed selectors that failed as XPath, they go straight to CSS
+
+@functools.lru_cache(maxsize=None)
+def compile_css_selector(selector: str) -> Callable[[Any], Any]:
+    """Compile a CSS selector once, unless it relies on lxml's own XPath functions."""
+    compiled_selector = CSSSelector(selector, translator="html")
+    if "__lxml_internal_css:" in compiled_selector.path:
+        # lxml loses these functions on an already evaluated selector after any failed XPath evaluation (":contains()")
+        return lambda node: CSSSelector(selector, translator="html")(node)
+    return compiled_selector
+
+@functools.lru_cache(maxsize=None)
+def compile_selector(selector: str) -> Optional[Callable[[Any], Any]]:
+    """Compile a store selector once: XPath by default, with CSS support for store configs."""
     selector = selector.strip()
     if not selector:
-        return []
+        return None
 
     if selector.startswith("xpath:"):
-        return list(node.xpath(selector.removeprefix("xpath:").strip()))
+        return etree.XPath(selector.removeprefix("xpath:").strip())
 
     if selector.startswith("css:"):
-        return list(node.cssselect(selector.removeprefix("css:").strip()))
+        return compile_css_selector(selector.removeprefix("css:").strip())
 
     try:
-        return list(node.xpath(selector))
+        return etree.XPath(selector)
     except XPathError:
-        return list(node.cssselect(selector))
+        return compile_css_selector(selector)
+
+def contains_text(value: Any, text: str) -> bool:
+    """Check if a selected element or string contains the text."""
+    if isinstance(value, etree._Element):
+        return bool(CONTAINS_TEXT_XPATH(value, text=text))
+    return text in (format_selector_value(value) or "")
+
+def select_values(node: Any, selector: str) -> List[Any]:
+    """Evaluate a selector as XPath by default, with CSS support for store configs."""
+    if selector in css_fallback_selectors:
+        return list(compile_css_selector(selector.strip())(node))
+
+    compiled_selector = compile_selector(selector)
+    if compiled_selector is None:
+        return []
+
+    try:
+        return list(compiled_selector(node))
+    except XPathEvalError:
+        # CSS like "li:first-child" also compiles as XPath and only fails when evaluated
+        if type(compiled_selector) is not etree.XPath or selector.strip().startswith("xpath:"):
+            raise
+        css_fallback_selectors.add(selector)
+        return list(compile_css_selector(selector.strip())(node))
 
 def format_selector_value(value: Any, attribute: Optional[str] = None) -> Optional[str]:
     if isinstance(value, str):
@@ -208,8 +418,11 @@ def get_body_element(tree: html.HtmlElement) -> html.HtmlElement:
     body_matches = tree.xpath("//body")
     return body_matches[0] if body_matches else tree
 
-def parse_product_details(product, config) -> Optional[ProductDataType]:
+def parse_product_details(product, config, price_plan: Optional[List[PricePlanEntry]] = None) -> Optional[ProductDataType]:
     """Extract product details from a product element using XPath."""
+    if price_plan is None:
+        price_plan = build_price_plan(config)
+
     try:
         name = get_selector_value(product, config["item_name_selector"])
 
@@ -219,10 +432,12 @@ def parse_product_details(product, config) -> Optional[ProductDataType]:
         image_url = get_selector_value(product, config["item_image_selector"], "src")
 
         prices: ProductPricesDataType = {}
-        for price_config in config.get("item_price_selectors", []):
-            price_text = get_selector_value(product, price_config["selector"])
+        for currency, selector, pattern, divisor in price_plan:
+            price_text = get_selector_value(product, selector)
             if price_text:
-                prices.update(parse_prices(price_text, price_config))
+                price = parse_price(price_text, pattern, divisor)
+                if price is not None:
+                    prices[currency] = price
 
         return {
             "name": name,
@@ -236,14 +451,15 @@ def parse_product_details(product, config) -> Optional[ProductDataType]:
         logger.error(f"Error parsing product details: {e}")
         return None
 
-async def extract_items_by_config(tree: html.HtmlElement, config: StoreOptionsDataType) -> List[ProductDataType]:
+def extract_items_by_config(tree: html.HtmlElement, config: StoreOptionsDataType) -> List[ProductDataType]:
     """Extract product details from the HTML using store-specific configuration."""
     try:
         products = select_values(tree, config["item_container_selector"])
         current_items: List[ProductDataType] = []
+        price_plan = build_price_plan(config)
 
         for product in products:
-            product_details = parse_product_details(product, config)
+            product_details = parse_product_details(product, config, price_plan)
             if product_details:
                 sold_out = check_sold_out(product, config["sold_out_selector"]) if "sold_out_selector" in config else False
                 product_details["archived"] = sold_out
@@ -262,36 +478,22 @@ def check_sold_out(product, sold_out_selector) -> bool:
         logger.error(f"Invalid sold_out_selector: {e}")
         return False
 
-async def compare_with_database(database: StoreDatabase, store_name: str, current_urls: set[str]) -> set[str]:
-    """Compare current products with database and return URLs that should be archived."""
+async def process_items(database: StoreDatabase, store_name: str, current_items: List[ProductDataType]) -> Optional[Tuple[List[ProductDataType], List[ProductDataType]]]:
+    """Save the items to the database and check for changes, None if they could not be saved."""
     try:
-        db_products = await database.get_products(store_name)
-        db_urls = {p["product_url"] for p in db_products if not p.get("archived", False)}
-        to_archive = db_urls - current_urls # URLs in DB but not in current URLs
-        logger.info(f"Found {len(to_archive)} products to archive")
-        return to_archive
-    except Exception as e:
-        logger.error(f"Error comparing products with database: {e}")
-        return set()
-
-async def process_items(database: StoreDatabase, store_name: str, current_items: List[ProductDataType]) -> Tuple[List[ProductDataType], List[ProductDataType]]:
-    """Save the items to the database and check for changes."""
-    try:
-        result = await database.sync_store_products(store_name, current_items)
-        new_products: List[ProductDataType]
-        updated_products: List[ProductDataType]
-        new_products, updated_products = result
-        return new_products, updated_products
+        return await database.sync_store_products(store_name, current_items)
     except Exception as e:
         logger.error(f"Error processing items for {store_name}: {e}")
-        return [], []
+        return None
 
-async def process_batch(database: StoreDatabase, store_name: str, items: List[ProductDataType], context: str = "") -> Tuple[List[ProductDataType], List[ProductDataType]]:
-    """Process a batch of items with error handling."""
+async def process_batch(database: StoreDatabase, store_name: str, items: List[ProductDataType], context: str = "") -> Optional[Tuple[List[ProductDataType], List[ProductDataType]]]:
+    """Process a batch of items with error handling, None if the batch could not be saved."""
     if not items:
         return [], []
     try:
         result = await process_items(database, store_name, items)
+        if result is None:
+            return None
         new_products, updated_products = result
         if new_products:
             logger.info(f"Found {len(new_products)} new items{' ' + context if context else ''}")
@@ -300,9 +502,9 @@ async def process_batch(database: StoreDatabase, store_name: str, items: List[Pr
         return new_products, updated_products
     except Exception as e:
         logger.error(f"Error processing batch{' ' + context if context else ''}: {e}")
-        return [], []
+        return None
 
-async def get_next_page_url_by_config(tree: html.HtmlElement, store: StoreOptionsDataType) -> Optional[str]:
+def get_next_page_url_by_config(tree: html.HtmlElement, store: StoreOptionsDataType) -> Optional[str]:
     """Identify the URL of the last 'Next' button based on the site configuration."""
     try:
         next_links = select_values(tree, store["next_page_selector"])
@@ -315,7 +517,7 @@ async def get_next_page_url_by_config(tree: html.HtmlElement, store: StoreOption
             text_matches = [
                 next_link
                 for next_link in next_links
-                if next_page_text in (format_selector_value(next_link) or "")
+                if contains_text(next_link, next_page_text)
             ]
             if text_matches:
                 next_links = text_matches
@@ -331,6 +533,17 @@ async def get_next_page_url_by_config(tree: html.HtmlElement, store: StoreOption
         logger.error(f"Error finding next page for {store['base_url']}: {e}")
         return None
 
+def parse_page(html_content: str, store: StoreOptionsDataType) -> Tuple[List[ProductDataType], Optional[str]]:
+    """Parse a page once and extract both its items and the next page URL."""
+    body = get_body_element(html.fromstring(html_content))
+    return extract_items_by_config(body, store), get_next_page_url_by_config(body, store)
+
+def canonical_url(url: str) -> Tuple[str, str, str, Tuple[Tuple[str, str], ...]]:
+    """Reduce a page URL to a form where trailing slashes, host case and query order do not matter."""
+    parts = urlparse(url)
+    query = tuple(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), query
+
 async def main_program(session: Optional[ClientSession], store: StoreConfigDataType, database: StoreDatabase) -> Tuple[List[ProductDataType], List[ProductDataType]]:
     """Main program to fetch and process data for a store."""
     url = store['options']['base_url']
@@ -339,7 +552,8 @@ async def main_program(session: Optional[ClientSession], store: StoreConfigDataT
     all_product_urls: set[str] = set()
     all_new_products: List[ProductDataType] = []
     all_updated_products: List[ProductDataType] = []
-    visited_urls = set()
+    visited_urls: set[Tuple[str, str, str, Tuple[Tuple[str, str], ...]]] = set() # Canonical forms, see canonical_url
+    next_page_fetch: Optional[asyncio.Task[Optional[str]]] = None
 
     try:
         current_url = store['options']["base_url"]
@@ -348,42 +562,76 @@ async def main_program(session: Optional[ClientSession], store: StoreConfigDataT
         # Phase 1: Process each page immediately and collect URLs
         while current_url:
             try:
-                if current_url in visited_urls:
+                if canonical_url(current_url) in visited_urls:
                     logger.info(f"URL already visited: {current_url}")
                     break
 
-                visited_urls.add(current_url)
-                html_content = await try_get_page_content(current_url, session, store=store['options'])
-                if not html_content:
-                    logger.error(f"Failed to get content from {current_url} after 3 attempts")
+                visited_urls.add(canonical_url(current_url))
+                cached_page: Optional[CachedPageDataType] = None
+                try:
+                    if next_page_fetch is not None:
+                        html_content = await next_page_fetch # Started while the previous page was being saved
+                    else:
+                        html_content = await fetch_page_politely(current_url, session, store['options'])
+                except PageNotModified:
+                    html_content = None
+                    cached_page = cached_pages.get(current_url)
+                    if cached_page is None:
+                        # Cache entry dropped after the request went out, fetch again without validators
+                        html_content = await fetch_page_politely(current_url, session, store['options'])
+                finally:
+                    next_page_fetch = None
+
+                if cached_page is not None:
+                    # Same page as last run, its products are already saved
+                    logger.info(f"Page not modified since last run: {current_url}")
+                    page_items: List[ProductDataType] = []
+                    page_product_urls = cached_page["product_urls"]
+                    next_url = cached_page["next_url"]
+                    # Not synced, so refresh last_seen here to keep it meaning the last time the product was listed
+                    await database.touch_listed_products(store["name"], page_product_urls)
+                elif not html_content:
+                    logger.error(f"Failed to get content from {current_url}")
                     success = False
                     break
-
-                tree = html.fromstring(html_content)
-                body = get_body_element(tree)
-
-                # Process items from this page
-                page_items = await extract_items_by_config(body, store['options'])
-
+                else:
+                    # Parse and extract off the event loop, other stores keep fetching meanwhile
+                    page_items, next_url = await asyncio.get_running_loop().run_in_executor(
+                        page_parse_executor, parse_page, html_content, store['options']
+                    )
+                    page_product_urls = [item["product_url"] for item in page_items]
+
+                # Wait for the host's turn and fetch the next page now, so it overlaps with the database work below
+                if next_url and canonical_url(next_url) not in visited_urls:
+                    next_page_fetch = asyncio.create_task(
+                        fetch_page_politely(next_url, session, store['options'])
+                    )
+
+                page_saved = True
                 if page_items:
                     # Update products for this page immediately
                     result = await process_batch(database, store["name"], page_items, "from current page")
-                    new_products, updated_products = result
-                    if new_products:
-                        all_new_products.extend(new_products)
-                    if updated_products:
-                        all_updated_products.extend(updated_products)
-
-                    # Collect URLs for final comparison
-                    page_urls = {item["product_url"] for item in page_items}
-                    all_product_urls.update(page_urls)
+                    if result is None:
+                        page_saved = False
+                    else:
+                        new_products, updated_products = result
+                        if new_products:
+                            all_new_products.extend(new_products)
+                        if updated_products:
+                            all_updated_products.extend(updated_products)
+
+                # Collect URLs for final comparison
+                all_product_urls.update(page_product_urls)
+                if cached_page is None:
+                    if page_saved:
+                        remember_page(current_url, page_product_urls, next_url)
+                    else:
+                        forget_page(current_url) # A 304 next run would skip the products that failed to save
 
-                next_url = await get_next_page_url_by_config(body, store['options'])
                 if not next_url:
                     break
 
                 current_url = next_url
-                await asyncio.sleep(store['options'].get("delay_between_requests", 5) + random.uniform(0, 2))
 
             except asyncio.CancelledError:
                 logger.warning("Task cancelled during page fetching...")
@@ -399,16 +647,20 @@ async def main_program(session: Optional[ClientSession], store: StoreConfigDataT
             logger.info(f"All pages processed. Found total of {len(all_product_urls)} products.")
             logger.info("Checking for products to archive...")
 
-            # Compare with database and archive missing products
-            to_archive = await compare_with_database(database, store["name"], all_product_urls)
-            if to_archive:
-                await database.mark_products_as_archived(store["name"], list(to_archive))
-                logger.info(f"Marked {len(to_archive)} products as archived in final check")
+            # Archive the products that are in the database but no longer listed
+            archived_count = await database.archive_missing_products(store["name"], all_product_urls)
+            if archived_count:
+                logger.info(f"Marked {archived_count} products as archived in final check")
 
     except Exception as e:
         logger.error(f"Critical error in main_program for {store['name']}: {e}")
 
     finally:
+        if next_page_fetch is not None: # Pagination stopped early, drop the prefetch
+            next_page_fetch.cancel()
+            # Retrieve its outcome so a failed prefetch is not reported as a never-retrieved exception
+            next_page_fetch.add_done_callback(lambda task: task.cancelled() or task.exception())
+
         # Always return any new products we found, even if there were errors
         if not all_new_products:
             logger.info(f"No new products found for {store['name']}")
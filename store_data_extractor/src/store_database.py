@@ -1,6 +1,9 @@
-from sqlite3 import connect, Error, Row
-from typing import Optional, List, Dict, Tuple
+from sqlite3 import connect, register_adapter, Error
+from typing import Any, Callable, Iterable, Optional, List, Dict, Tuple, TypeVar
+from concurrent.futures import Future, ThreadPoolExecutor
 import os
+import functools
+from pathlib import Path
 from datetime import datetime
 import asyncio
 import sys
@@ -17,19 +20,85 @@ ensure_directory_exists(DATA_DIR)  # Ensure that the data directory exists
 
 SQLITE_STORE_DB_FILE = os.path.join(DATA_DIR, "store_db.sqlite")  # SQLite database file
 
+# Hot statements, shared so sqlite3's statement cache always hands back the same prepared statement
+SELECT_STORE_ID_SQL = "SELECT id FROM Store WHERE name = ?"
+SELECT_STORE_PRODUCTS_SQL = "SELECT id, product_url, image_url FROM Product WHERE store_id = ? ORDER BY id"
+INSERT_PRODUCT_SQL = """
+    INSERT INTO Product (name, product_url, image_url, price_jpy, price_eur, archived, store_id, first_seen, last_seen, is_sent)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_PRODUCT_SQL = """
+    UPDATE Product
+    SET price_jpy = ?, price_eur = ?, archived = ?,
+        last_seen = ?
+    WHERE id = ?
+"""
+ARCHIVE_UNLISTED_PRODUCTS_SQL = """
+    UPDATE Product
+    SET archived = 1, last_seen = ?
+    WHERE store_id = ? AND archived = 0 AND product_url NOT IN (SELECT url FROM temp.UrlBatch)
+"""
+TOUCH_LISTED_PRODUCTS_SQL = """
+    UPDATE Product
+    SET last_seen = ?
+    WHERE store_id = ? AND product_url IN (SELECT url FROM temp.UrlBatch)
+"""
+
+# Timestamps are stored in the same text format as sqlite3's default adapter, which is deprecated since Python 3.12
+register_adapter(datetime, lambda value: value.isoformat(" "))
+
+MMAP_SIZE_BYTES = 256 * 1024 * 1024  # Reads come straight from the mapped file, the whole database fits
+
+INSERT_BATCH_SIZE = 100  # Rows per multi-row INSERT, 1000 bound parameters
+STATEMENT_CACHE_SIZE = 256
+
+T = TypeVar("T")
+
+# (name, product_url, image_url, price_jpy, price_eur, archived) of a scraped product
+ProductRow = Tuple[str, str, str, Optional[float], Optional[float], int]
+
+@functools.lru_cache(maxsize=None)
+def build_insert_products_sql(row_count: int) -> str:
+    """Build a multi-row product INSERT, cached so each size is prepared once."""
+    values = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"] * row_count)
+    return f"""
+        INSERT INTO Product (name, product_url, image_url, price_jpy, price_eur, archived, store_id, first_seen, last_seen, is_sent)
+        VALUES {values}
+        RETURNING id, image_url, product_url
+    """
+
 class StoreDatabase:
     """Manage the store data in an SQLite database."""
     def __init__(self) -> None:
         self.logger = logging.getLogger("StoreDatabase")
         self.store_db_file_name = SQLITE_STORE_DB_FILE
         self.db_name = "Store Database"
-        self.db_lock = asyncio.Lock()
-
+        # A single worker thread runs every query, so they never block the event loop and stay serialized
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-db")
+        # Reads use their own read-only connection and thread, under WAL they never wait for a write
+        self.read_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-db-read")
+        self.store_ids: Dict[str, int] = {} # Store name -> id, stores are only ever added or deleted by name
+        self.conn = None
+        self.read_conn = None
+        # Connecting and creating the schema touch the disk, so they run on the database thread instead of the event loop.
+        # Writes queue up behind it on the same thread, reads wait for it first.
+        self.opened: Future[None] = self.executor.submit(self.open_connections)
+
+    def open_connections(self) -> None:
+        """Open the write and read-only connections and initialize the database."""
         try:
-            self.conn = connect(self.store_db_file_name, isolation_level=None, check_same_thread=False, timeout=30.0)
-            self.conn.row_factory = Row
+            # Room for every multi-row INSERT size next to the other statements, the default cache holds 128
+            self.conn = connect(self.store_db_file_name, isolation_level=None, check_same_thread=False, timeout=30.0,
+                                cached_statements=STATEMENT_CACHE_SIZE)
             self.cursor = self.conn.cursor()
             self.init_database()
+            read_uri = f"{Path(self.store_db_file_name).resolve().as_uri()}?mode=ro"
+            self.read_conn = connect(read_uri, uri=True, isolation_level=None, check_same_thread=False, timeout=30.0)
+            self.read_cursor = self.read_conn.cursor()
+            # Per-connection settings, the read connection gets the same cache as the writer
+            self.read_cursor.execute("PRAGMA temp_store=MEMORY;")
+            self.read_cursor.execute("PRAGMA cache_size=-20000;") # 20 MB page cache
+            self.read_cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES};")
             self.logger.info(f"Using SQLite database file: {self.store_db_file_name}")
         except Error as e:
             self.logger.error(f"Failed to connect to the database {self.db_name}: {e}")
@@ -40,7 +109,16 @@ class StoreDatabase:
         try:
             self.cursor.execute("PRAGMA foreign_keys = ON;")
             self.cursor.execute("PRAGMA busy_timeout = 30000;")
-            self.cursor.execute("PRAGMA journal_mode=WAL;")
+            journal_mode = self.cursor.execute("PRAGMA journal_mode=WAL;").fetchone()[0]
+            if journal_mode != "wal":
+                self.logger.warning(f"WAL mode not available for {self.db_name}, using {journal_mode}")
+            self.cursor.execute("PRAGMA synchronous=NORMAL;") # WAL keeps this crash safe, fsync only at checkpoints
+            self.cursor.execute("PRAGMA temp_store=MEMORY;")
+            self.cursor.execute("PRAGMA cache_size=-20000;") # 20 MB page cache
+            self.cursor.execute("PRAGMA journal_size_limit=6144000;") # Truncate the WAL file back to ~6 MB after checkpoints
+            self.cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES};")
+            # Scratch table of the archive statements, per connection and independent of the schema below
+            self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS UrlBatch (url TEXT PRIMARY KEY) WITHOUT ROWID")
             self.cursor.executescript("""
                 CREATE TABLE IF NOT EXISTS Store (
                     id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
@@ -59,9 +137,17 @@ class StoreDatabase:
                     last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     is_sent INTEGER DEFAULT 0,
                     store_id INTEGER NOT NULL,
-                    FOREIGN KEY (store_id) REFERENCES Store (id)
+                    FOREIGN KEY (store_id) REFERENCES Store (id) ON DELETE CASCADE
                 );
+                CREATE INDEX IF NOT EXISTS ix_product_store_url ON Product (store_id, product_url);
+                CREATE INDEX IF NOT EXISTS ix_product_store_image ON Product (store_id, image_url);
+                CREATE INDEX IF NOT EXISTS ix_product_unsent ON Product (store_id) WHERE is_sent = 0;
             """)
+            try:
+                self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_store_name ON Store (name)")
+            except Error as e:
+                # Older databases may hold the same store name twice, lookups then just scan the small Store table
+                self.logger.warning(f"Store name index not created for {self.db_name}: {e}")
             self.logger.info("Database initialized successfully.")
         except Error as e:
             self.logger.error(f"Failed to initialize the database {self.db_name}: {e}")
@@ -69,285 +155,273 @@ class StoreDatabase:
     async def close_connection(self) -> None:
         """Close the database connection."""
         self.logger.info("Closing database connection...")
+        await asyncio.wrap_future(self.opened)
         if self.conn:
-            self.conn.close()
+            await self.run_in_db_thread(self.close_connection_sync) # Queued behind any running query
+        if self.read_conn:
+            await self.run_in_read_thread(self.read_conn.close)
+        self.executor.shutdown(wait=False)
+        self.read_executor.shutdown(wait=False)
+
+    def close_connection_sync(self) -> None:
+        """Refresh the planner statistics the indexes rely on, then close the write connection."""
+        try:
+            self.cursor.execute("PRAGMA optimize;") # Runs ANALYZE only where the statistics are stale
+        except Error as e:
+            self.logger.warning(f"Failed to optimize {self.db_name}: {e}")
+        self.conn.close()
+
+    async def run_in_db_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking database call on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def run_in_read_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking read on the read thread."""
+        await asyncio.wrap_future(self.opened)
+        return await asyncio.get_running_loop().run_in_executor(self.read_executor, func, *args)
+
+    def run_in_transaction(self, func: Callable[..., T], *args: Any) -> T:
+        """Run func inside one write transaction, rolled back if it raises."""
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self.cursor.execute("ROLLBACK")
+            raise
+        self.cursor.execute("COMMIT")
+        return result
 
     def add_store(self, name: str) -> Optional[int]:
         """Add a store to the database if it doesn't exist and return the store ID."""
-        try:
-            store: Optional[Row] = self.cursor.execute("SELECT id FROM Store WHERE name = ?", (name,)).fetchone()
-            if store:
-                return int(store["id"])
+        if name in self.store_ids:
+            return self.store_ids[name]
 
-            self.logger.info(f"Store '{name}' not found. Creating a new store...")
-            self.cursor.execute("INSERT INTO Store (name) VALUES (?)", (name,))
+        try:
+            store: Optional[Tuple[int]] = self.cursor.execute(SELECT_STORE_ID_SQL, (name,)).fetchone()
+            if store is None:
+                self.logger.info(f"Store '{name}' not found. Creating a new store...")
+                store = self.cursor.execute("INSERT INTO Store (name) VALUES (?) RETURNING id", (name,)).fetchone()
+            if store is None:
+                return None
 
-            store_row: Optional[Row] = self.cursor.execute("SELECT id FROM Store WHERE name = ?", (name,)).fetchone()
-            return int(store_row["id"]) if store_row else None
+            self.store_ids[name] = int(store[0])
+            return self.store_ids[name]
 
         except Error as e:
             self.logger.error(f"Error adding store '{name}': {e}")
             return None
 
-    async def add_or_update_product(self, name: str, product_url: str, image_url: Optional[str],
-                                     price_jpy: Optional[float], price_eur: Optional[float],
-                                     archived: int, store_name: str, mark_sent: bool = False) -> Tuple[str, Optional[ProductDataType]]:
-        """
-        Add or update a product in the database.
-        Always updates last_seen and archived status.
-        Checks both URL and name to determine if product exists.
-        With mark_sent=True new products are inserted as already sent (used on the
-        initial fetch so a fresh database never floods notification channels).
-        """
-        store_id: Optional[int] = self.add_store(store_name)
-        if store_id is None:
-            self.logger.error(f"Failed to find or create store {store_name}")
-            return "error", None
+    async def get_stores(self) -> List[StoreDataType]:
+        """Get all stores without blocking the event loop."""
+        return await self.run_in_read_thread(self.get_stores_sync)
 
-        async with self.db_lock:
-            try:
-                now = datetime.now()
-                # Check image_url exists, to check if product exists in db
-                db_products: List[Row] = self.cursor.execute(
-                    """
-                    SELECT id, name, product_url, image_url, price_jpy, price_eur
-                    FROM Product
-                    WHERE (image_url = ?)
-                    AND store_id = ?
-                    """,
-                    (image_url, store_id)
-                ).fetchall()
-                # Case 1: No products with this image_url exist - create new product
-                if not db_products:
-                    self.cursor.execute("""
-                        INSERT INTO Product (name, product_url, image_url, price_jpy, price_eur, archived, store_id, first_seen, last_seen, is_sent)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                                        (name, product_url, image_url, price_jpy, price_eur, archived, store_id, now, now, int(mark_sent)))
-                    if self.cursor.lastrowid is None:
-                        self.logger.error(f"Failed to insert new product '{product_url}'")
-                        return "error", None
-                    new_product: ProductDataType = {
-                        "id": self.cursor.lastrowid,
-                        "name": name,
-                        "product_url": product_url,
-                        "image_url": image_url,
-                        "prices": {
-                            "JPY": price_jpy if price_jpy is not None else None,
-                            "EUR": price_eur if price_eur is not None else None
-                        }
-                    }
-                    return "new", new_product
-
-                # Case 2: Products with this image_url exist - check for matching product_url
-                matching_product = None
-                for product in db_products:
-                    if product["product_url"] == product_url:
-                        matching_product = product
-                        break
-
-                # Case 2a: No product with matching URL - create a new instance with same image
-                if matching_product is None:
-                    # check does product_url exist in the list, if not, insert and return update. if product_url exits, update the product and return updated
-                    # New product instance
-                    self.cursor.execute("""
-                        INSERT INTO Product (name, product_url, image_url, price_jpy, price_eur, archived, store_id, first_seen, last_seen, is_sent)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                                        (name, product_url, image_url, price_jpy, price_eur, archived, store_id, now, now, int(mark_sent)))
-                    if self.cursor.lastrowid is None:
-                        self.logger.error(f"Failed to insert new product '{product_url}'")
-                        return "error", None
-                    updated_product: ProductDataType = {
-                        "id": self.cursor.lastrowid,
-                        "name": name,
-                        "product_url": product_url,
-                        "image_url": image_url,
-                        "prices": {
-                            "JPY": price_jpy if price_jpy is not None else None,
-                            "EUR": price_eur if price_eur is not None else None
-                        }
-                    }
-                    return "updated", updated_product
-
-                # Updates but not alerts
-                # Case 2b: Found product with matching URL - update it
-                product_id = matching_product["id"]
-                self.cursor.execute("""
-                    UPDATE Product
-                    SET price_jpy = ?, price_eur = ?, archived = ?,
-                        last_seen = ?
-                    WHERE id = ?
-                """, (price_jpy, price_eur, archived, now, product_id))
-
-                return "", None
-
-            except Error as e:
-                self.logger.error(f"Error adding/updating product '{product_url}': {e}")
-                return "error", None
-
-    def get_stores(self) -> List[StoreDataType]:
+    def get_stores_sync(self) -> List[StoreDataType]:
         """Get all stores from the database."""
         try:
-            rows: List[Row] = self.cursor.execute("SELECT * FROM Store").fetchall()
+            rows = self.read_cursor.execute("SELECT id, name, initial_fetch FROM Store") # Rows are read straight off the cursor
             return [
                 {
-                    "id": row["id"],
-                    "name": row["name"],
-                    "initial_fetch": row["initial_fetch"]
+                    "id": store_id,
+                    "name": name,
+                    "initial_fetch": initial_fetch
                 }
-                for row in rows
+                for store_id, name, initial_fetch in rows
             ]
         except Error as e:
             self.logger.error(f"Error fetching stores: {e}")
             return []
 
     async def get_products(self, store_name: str) -> List[ProductDataType]:
+        """Get all products for a store without blocking the event loop."""
+        return await self.run_in_read_thread(self.get_products_sync, store_name)
+
+    def get_products_sync(self, store_name: str) -> List[ProductDataType]:
         """Get all products for a store."""
         try:
-            store: Optional[Row] = self.cursor.execute("SELECT id FROM Store WHERE name = ?", (store_name,)).fetchone()
+            store: Optional[Tuple[int]] = self.read_cursor.execute(SELECT_STORE_ID_SQL, (store_name,)).fetchone()
             if store is None:
                 self.logger.error(f"Store '{store_name}' not found.")
                 return []
 
-            store_id: int = store["id"]
-            products: List[Row] = self.cursor.execute(
-                "SELECT id, name, product_url, image_url, price_jpy, price_eur, archived FROM Product WHERE store_id = ?",
+            store_id: int = store[0]
+            products = self.read_cursor.execute(
+                "SELECT id, name, product_url, image_url, NULLIF(price_jpy, 0.0), NULLIF(price_eur, 0.0), archived FROM Product WHERE store_id = ?",
                 (store_id,)
-            ).fetchall()
+            )
 
+            # Iterate the cursor instead of materializing fetchall(), positional unpacking, no per-column name lookups
+            # Zero prices come back as NULL straight from the query
             return [
                 {
-                    "id": product["id"],
-                    "name": product["name"],
-                    "product_url": product["product_url"],
-                    "image_url": product["image_url"],
+                    "id": product_id,
+                    "name": name,
+                    "product_url": product_url,
+                    "image_url": image_url,
                     "prices": {
-                        "JPY": product["price_jpy"] if product["price_jpy"] != 0.0 else None,
-                        "EUR": product["price_eur"] if product["price_eur"] != 0.0 else None
+                        "JPY": price_jpy,
+                        "EUR": price_eur
                     },
-                    "archived": bool(product["archived"])
+                    "archived": bool(archived)
                 }
-                for product in products
+                for product_id, name, product_url, image_url, price_jpy, price_eur, archived in products
             ]
         except Error as e:
             self.logger.error(f"Error fetching products for store '{store_name}': {e}")
             return []
 
     async def get_unsent_products(self, store_name: Optional[str] = None) -> List[ProductDataType]:
+        """Get the unsent products without blocking the event loop."""
+        return await self.run_in_read_thread(self.get_unsent_products_sync, store_name)
+
+    def get_unsent_products_sync(self, store_name: Optional[str]) -> List[ProductDataType]:
         """Get all products that have not been sent, optionally for a single store."""
         try:
             if store_name is not None:
-                products: List[Row] = self.cursor.execute(
+                products = self.read_cursor.execute(
                     """
-                    SELECT p.id, p.name, p.product_url, p.image_url, p.price_jpy, p.price_eur
+                    SELECT p.id, p.name, p.product_url, p.image_url, NULLIF(p.price_jpy, 0.0), NULLIF(p.price_eur, 0.0)
                     FROM Product p
                     JOIN Store s ON s.id = p.store_id
                     WHERE p.is_sent = 0 AND s.name = ?
                     """,
                     (store_name,)
-                ).fetchall()
+                )
             else:
-                products = self.cursor.execute(
-                    "SELECT id, name, product_url, image_url, price_jpy, price_eur FROM Product WHERE is_sent = 0"
-                ).fetchall()
-
-            if not products:
-                return []
+                products = self.read_cursor.execute(
+                    "SELECT id, name, product_url, image_url, NULLIF(price_jpy, 0.0), NULLIF(price_eur, 0.0) FROM Product WHERE is_sent = 0"
+                )
 
             return [
                 {
-                    "id": product["id"],
-                    "name": product["name"],
-                    "product_url": product["product_url"],
-                    "image_url": product["image_url"],
+                    "id": product_id,
+                    "name": name,
+                    "product_url": product_url,
+                    "image_url": image_url,
                     "prices": {
-                        "JPY": product["price_jpy"] if product["price_jpy"] != 0.0 else None,
-                        "EUR": product["price_eur"] if product["price_eur"] != 0.0 else None
+                        "JPY": price_jpy,
+                        "EUR": price_eur
                     }
                 }
-                for product in products
+                for product_id, name, product_url, image_url, price_jpy, price_eur in products
             ]
         except Error as e:
             self.logger.error(f"Error fetching unsent products: {e}")
             return []
 
-    async def sync_store_products(self, store_name: str, current_items: List[ProductDataType]) -> Tuple[List[ProductDataType], List[ProductDataType]]:
+    async def sync_store_products(self, store_name: str, current_items: List[ProductDataType]) -> Optional[Tuple[List[ProductDataType], List[ProductDataType]]]:
         """
         Add new products to the database and update existing ones.
-        Returns a tuple of lists: (new_products, updated_products).
+        Returns a tuple of lists: (new_products, updated_products), or None if nothing could be saved.
         """
-        store_id: Optional[int] = self.add_store(store_name)
+        store_id: Optional[int] = await self.run_in_db_thread(self.add_store, store_name)
         if store_id is None:
             self.logger.error(f"Failed to find or create store {store_name}")
-            return [], []
+            return None
+
+        # Cleaned up before the transaction, so the write lock is held only for database work
+        rows = self.prepare_product_rows(current_items)
+        error_count = len(current_items) - len(rows)
 
+        # One transaction for the whole page, a single commit instead of one per product
+        try:
+            return await self.run_in_db_thread(self.run_in_transaction, self.sync_store_products_sync, store_name, store_id, rows, error_count)
+        except Error as e:
+            self.logger.error(f"Error syncing products for store {store_name}: {e}")
+            return None
+
+    def prepare_product_rows(self, current_items: List[ProductDataType]) -> List[ProductRow]:
+        """Turn scraped items into (name, product_url, image_url, price_jpy, price_eur, archived) rows, skipping broken ones."""
+        rows: List[ProductRow] = []
+        for item in current_items:
+            try:
+                prices = item.get("prices", {})
+                price_jpy = prices.get("JPY")
+                price_eur = prices.get("EUR")
+                rows.append((
+                    item["name"].strip(),
+                    item["product_url"].strip(),
+                    str(item.get("image_url", "")).strip(),
+                    float(price_jpy) if isinstance(price_jpy, (int, float)) else None,
+                    float(price_eur) if isinstance(price_eur, (int, float)) else None,
+                    int(bool(item.get("archived", False))),
+                ))
+            except Exception as e:
+                self.logger.error(f"Error processing item {item}: {e}")
+        return rows
+
+    def sync_store_products_sync(self, store_name: str, store_id: int, rows: List[ProductRow], error_count: int) -> Tuple[List[ProductDataType], List[ProductDataType]]:
+        """Sync the prepared product rows inside an open transaction."""
         # Check if this is the first fetch for the store
         initial_fetch: bool = self.cursor.execute(
             "SELECT initial_fetch FROM Store WHERE id = ?", (store_id,)
         ).fetchone()[0] is None
 
+        now = datetime.now().isoformat(" ") # Formatted once, every row binds the same string without the adapter
         if initial_fetch:
             self.cursor.execute(
                 "UPDATE Store SET initial_fetch = ? WHERE id = ?",
-                (datetime.now(), store_id)
+                (now, store_id)
             )
             self.logger.info(f"First fetch for {store_name}. Skipping new product notifications.")
 
         new_products: List[ProductDataType] = []
         updated_products: List[ProductDataType] = []
-        inserted_count = 0
         existing_count = 0
-        error_count = 0
 
-        self.logger.info(f"Syncing {len(current_items)} products for store {store_name}.")
-        for item in current_items:
-            try:
+        # All products of the store in one query: image_url -> product_url -> id, the oldest row wins
+        known_products: Dict[str, Dict[str, int]] = {}
+        for product_id, product_url, image_url in self.cursor.execute(SELECT_STORE_PRODUCTS_SQL, (store_id,)):
+            known_products.setdefault(image_url, {}).setdefault(product_url, product_id)
+        pending_updates: List[Tuple[Optional[float], Optional[float], int, str, int]] = []
+        # New rows by (image_url, product_url), inserted together after the loop
+        pending_inserts: Dict[Tuple[str, str], List[Any]] = {}
+        pending_images: set[str] = set() # Images of the pending inserts, they count as known for later rows
+
+        self.logger.info(f"Syncing {len(rows)} products for store {store_name}.")
+        for name, product_url, image_url, price_jpy, price_eur, archived in rows:
+            # Match by image first, then by URL
+            urls_for_image = known_products.get(image_url)
+            if urls_for_image is not None and product_url in urls_for_image:
+                pending_updates.append((price_jpy, price_eur, archived, now, urls_for_image[product_url]))
+                existing_count += 1
+                continue
+
+            pending_row = pending_inserts.get((image_url, product_url))
+            if pending_row is not None: # Repeated on the page, the later copy updates the row but not the report
+                pending_row[3:6] = [price_jpy, price_eur, archived]
+                existing_count += 1
+                continue
+
+            pending_inserts[(image_url, product_url)] = [
+                name, product_url, image_url, price_jpy, price_eur, archived, store_id, now, now, int(initial_fetch),
+                # A known image under a new URL is reported as an update, also when an earlier row on the page brought it
+                urls_for_image is None and image_url not in pending_images,
+                {"JPY": price_jpy, "EUR": price_eur}, # Prices as first seen, which is what gets reported
+            ]
+            pending_images.add(image_url)
 
-                name = item["name"].strip()
-                product_url = item["product_url"].strip()
-                image_url = str(item.get("image_url", "")).strip()
+        if pending_updates:
+            self.cursor.executemany(UPDATE_PRODUCT_SQL, pending_updates)
 
-                raw_prices = item.get("prices", {})
-                prices: Dict[str, float] = {
-                    key: float(value)
-                    for key, value in raw_prices.items()
-                    if isinstance(value, (int, float))
+        inserted_count = len(pending_inserts)
+        if initial_fetch:
+            # Nothing is reported on the first fetch, so the new ids are not needed
+            self.cursor.executemany(INSERT_PRODUCT_SQL, [row[:10] for row in pending_inserts.values()])
+        else:
+            inserted_ids = self.insert_products(list(pending_inserts.values()))
+            for key, row in pending_inserts.items():
+                product: ProductDataType = {
+                    "id": inserted_ids[key],
+                    "name": row[0],
+                    "product_url": row[1],
+                    "image_url": row[2],
+                    "prices": row[11]
                 }
-
-                archived: bool = bool(item.get("archived", False))
-                price_jpy = prices.get("JPY", None)
-                price_eur = prices.get("EUR", None)
-
-                product_status, product = await self.add_or_update_product(
-                    name=name,
-                    product_url=product_url,
-                    image_url=image_url,
-                    price_jpy=price_jpy,
-                    price_eur=price_eur,
-                    archived=int(archived),
-                    store_name=store_name,
-                    mark_sent=initial_fetch
-                )
-
-                if product_status in ("new", "updated"):
-                    inserted_count += 1
-                elif product_status == "":
-                    existing_count += 1
-                else:
-                    error_count += 1
-
-                # Check if the product is new and not from the initial fetch
-                if product_status == "new" and product and not initial_fetch:
+                if row[10]:
                     new_products.append(product)
-
-                # Check updated products
-                elif product_status == "updated" and product and not initial_fetch:
+                else:
                     updated_products.append(product)
 
-
-            except Exception as e:
-                error_count += 1
-                self.logger.error(f"Error processing item {item}: {e}")
-
         self.logger.info(
             f"Database sync complete for {store_name}: "
             f"{inserted_count} inserted, {existing_count} existing/updated, {error_count} errors."
@@ -355,62 +429,104 @@ class StoreDatabase:
 
         return (new_products, updated_products)
 
-    async def mark_products_as_archived(self, store_name: str, urls: List[str]) -> None:
-        """Mark specific products as archived based on their URLs."""
-        if not urls:
-            return
-
+    def insert_products(self, rows: List[List[Any]]) -> Dict[Tuple[str, str], int]:
+        """Insert product rows with multi-row INSERTs, returns their ids by (image_url, product_url)."""
+        inserted_ids: Dict[Tuple[str, str], int] = {}
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            params = [value for row in batch for value in row[:10]]
+            for product_id, image_url, product_url in self.cursor.execute(build_insert_products_sql(len(batch)), params).fetchall():
+                inserted_ids[(image_url, product_url)] = product_id
+        return inserted_ids
+
+    async def archive_missing_products(self, store_name: str, current_urls: set[str]) -> int:
+        """Archive the store's products that are no longer listed, without blocking the event loop."""
+        return await self.run_in_db_thread(self.archive_missing_products_sync, store_name, current_urls)
+
+    def archive_missing_products_sync(self, store_name: str, current_urls: set[str]) -> int:
+        """Archive the store's active products whose URL is not in current_urls, returns how many were archived."""
         try:
             store_id = self.add_store(store_name)
             if store_id is None:
-                return
+                return 0
+
+            # SQLite computes the difference, the store's URLs never come back to Python
+            return self.run_in_transaction(self.update_by_url_batch, store_id, current_urls, ARCHIVE_UNLISTED_PRODUCTS_SQL)
+
+        except Error as e:
+            self.logger.error(f"Error archiving missing products for store {store_name}: {e}")
+            return 0
 
-            placeholders = ','.join('?' * len(urls))
-            query = f"""
-                UPDATE Product
-                SET archived = 1, last_seen = ?
-                WHERE store_id = ? AND product_url IN ({placeholders})
-            """
+    async def touch_listed_products(self, store_name: str, urls: List[str]) -> int:
+        """Refresh last_seen of products on an unchanged page without blocking the event loop."""
+        return await self.run_in_db_thread(self.touch_listed_products_sync, store_name, urls)
 
-            params = [datetime.now(), store_id] + urls
-            self.cursor.execute(query, params)
-            self.conn.commit()
+    def touch_listed_products_sync(self, store_name: str, urls: List[str]) -> int:
+        """Set last_seen to now for the store's products with these URLs, returns how many were updated."""
+        try:
+            store_id = self.add_store(store_name)
+            if store_id is None:
+                return 0
 
-            rows_affected = self.cursor.rowcount
-            if rows_affected > 0:
-                self.logger.info(f"Marked {rows_affected} products as archived for store {store_name}")
+            return self.run_in_transaction(self.update_by_url_batch, store_id, urls, TOUCH_LISTED_PRODUCTS_SQL)
 
         except Error as e:
-            self.logger.error(f"Error marking products as archived: {e}")
-            self.conn.rollback()
+            self.logger.error(f"Error refreshing listed products for store {store_name}: {e}")
+            return 0
+
+    def update_by_url_batch(self, store_id: int, urls: Iterable[str], query: str) -> int:
+        """Load the URLs into the temp URL table and run an UPDATE against it, inside an open transaction."""
+        # A temp table instead of an IN list, so any number of URLs is one prepared statement and one UPDATE
+        self.cursor.execute("DELETE FROM temp.UrlBatch")
+        self.cursor.executemany("INSERT OR IGNORE INTO temp.UrlBatch (url) VALUES (?)", ((url,) for url in urls))
+        self.cursor.execute(query, (datetime.now(), store_id))
+        rows_affected = self.cursor.rowcount
+        self.cursor.execute("DELETE FROM temp.UrlBatch")
+        return rows_affected
 
     async def mark_product_as_sent(self, product_id: int) -> None:
+        """Mark a product as sent without blocking the event loop."""
+        await self.run_in_db_thread(self.mark_product_as_sent_sync, product_id)
+
+    def mark_product_as_sent_sync(self, product_id: int) -> None:
         """Mark a product as sent in db when product is posted."""
         try:
             self.cursor.execute(
                 "UPDATE Product SET is_sent = 1 WHERE id = ?",
                 (product_id,)
-            )
-            self.conn.commit()
+            ) # A single statement, autocommitted
         except Error as e:
             self.logger.error(f"Error marking product {product_id} as sent: {e}")
-            self.conn.rollback()
 
-    def delete_store(self, store_name: str) -> None:
+    async def delete_store(self, store_name: str) -> None:
+        """Delete a store and its products without blocking the event loop."""
+        await self.run_in_db_thread(self.delete_store_sync, store_name)
+
+    def delete_store_sync(self, store_name: str) -> None:
         """Delete a store and its products from the database."""
         try:
-            store_row: Optional[Row] = self.cursor.execute("SELECT id FROM Store WHERE name = ?", (store_name,)).fetchone()
+            store_row: Optional[Tuple[int]] = self.cursor.execute(SELECT_STORE_ID_SQL, (store_name,)).fetchone()
             if store_row is None:
                 self.logger.error(f"Store '{store_name}' not found.")
                 return
 
-            store_id: int = store_row["id"]
-            self.cursor.execute("DELETE FROM Product WHERE store_id = ?", (store_id,))
-            self.cursor.execute("DELETE FROM Store WHERE id = ?", (store_id,))
+            store_id: int = store_row[0]
+            self.store_ids.pop(store_name, None)
+            self.run_in_transaction(self.delete_store_rows, store_id)
         except Error as e:
             self.logger.error(f"Error deleting store '{store_name}': {e}")
 
-    def delete_product(self, product_name: str) -> None:
+    def delete_store_rows(self, store_id: int) -> None:
+        """Delete a store and its products inside an open transaction."""
+        # Databases created before ON DELETE CASCADE keep the old foreign key, so products are still deleted explicitly
+        self.cursor.execute("DELETE FROM Product WHERE store_id = ?", (store_id,))
+        self.cursor.execute("DELETE FROM Store WHERE id = ?", (store_id,))
+
+    async def delete_product(self, product_name: str) -> None:
+        """Delete a product without blocking the event loop."""
+        await self.run_in_db_thread(self.delete_product_sync, product_name)
+
+    def delete_product_sync(self, product_name: str) -> None:
         """Delete a product from the database."""
         try:
             self.cursor.execute("DELETE FROM Product WHERE name = ?", (product_name,))
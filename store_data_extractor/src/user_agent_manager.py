@@ -1,7 +1,8 @@
 import os
 import aiofiles
+import aiofiles.os
 import asyncio
-from typing import List, Optional
+from typing import Optional, Tuple
 import logging
 
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -12,11 +13,11 @@ AGENT_INDEX_FILE = os.path.join(CONFIG_DIR, "last_user_agent_index.txt")
 
 class UserAgentManager:
     def __init__(self):
-        self.file_lock = asyncio.Lock()
-        self.index_lock = asyncio.Lock()
-        self.user_agent_list: List[str] = self._load_user_agents()
+        self.state_lock = asyncio.Lock() # Guards the index read-modify-write and the index file
+        self.user_agent_list: Tuple[str, ...] = self._load_user_agents()
         self.current_index: Optional[int] = None
-        self.highest_used_index: Optional[int] = None  # Track highest used index
+        self.agent_count = len(self.user_agent_list)
+        self.last_used_index: Optional[int] = None  # Index persisted between runs
         self.dirty = False
         self.logger = logging.getLogger("UserAgentManager")
         self._initialize_index()
@@ -26,46 +27,41 @@ class UserAgentManager:
         try:
             with open(AGENT_INDEX_FILE, 'r') as f:
                 loaded_index = int(f.read().strip()) + 1 # prevent using the same agent
-                if loaded_index > len(self.user_agent_list):
+                if loaded_index >= self.agent_count:
                     self.current_index = 0
-                    self.highest_used_index = 0
+                    self.last_used_index = 0
                 else:
                     self.current_index = loaded_index
-                    self.highest_used_index = loaded_index
+                    self.last_used_index = loaded_index
         except (FileNotFoundError, ValueError):
             self.current_index = 0
-            self.highest_used_index = 0
+            self.last_used_index = 0
 
-    def _load_user_agents(self) -> List[str]:
-        """Load user agents from file into a list."""
+    def _load_user_agents(self) -> Tuple[str, ...]:
+        """Load user agents from file into a tuple with a single read."""
         try:
-            with open(AGENT_LIST_FILE, 'r') as f:
-                return [agent.strip() for agent in f if agent.strip()]
+            with open(AGENT_LIST_FILE, 'rb') as f:
+                lines = f.read().splitlines()
+            return tuple(agent.decode('utf-8') for agent in map(bytes.strip, lines) if agent)
         except FileNotFoundError:
             raise RuntimeError(f"User agent file not found at {AGENT_LIST_FILE}")
 
     async def next_user_agent(self) -> str:
-        async with self.index_lock:
+        async with self.state_lock:
             if self.current_index is None:
                 self.current_index = 0
 
-            # Select agent based on current_index
-            agent = self.user_agent_list[self.current_index % len(self.user_agent_list)]
-
-            # Update highest used index
-            if self.highest_used_index is None or self.current_index > self.highest_used_index:
-                self.highest_used_index = self.current_index
-
-            # Increment the index
-            self.current_index += 1
+            # Select agent based on current_index, which always stays within the list
+            agent = self.user_agent_list[self.current_index]
+            self.last_used_index = self.current_index
+            self.current_index = (self.current_index + 1) % self.agent_count
             self.dirty = True
 
             return agent
 
     async def save_index_after_task(self, force: bool = False) -> None:
-        """Save the highest used index to file."""
-        # Use highest_used_index instead of current_index
-        if self.highest_used_index is None:
+        """Save the last used index to file."""
+        if self.last_used_index is None:
             return
 
         if not force and not self.dirty:
@@ -75,15 +71,16 @@ class UserAgentManager:
         retry_delay = 0.5
         last_error = None
 
-        async with self.index_lock:
+        async with self.state_lock:
             for attempt in range(max_retries):
                 try:
-                    async with self.file_lock:
-                        # Save the highest_used_index instead of current_index
-                        async with aiofiles.open(AGENT_INDEX_FILE, 'w') as f:
-                            await f.write(str(self.highest_used_index))
-                        self.dirty = False
-                        return
+                    # Write a temp file and swap it in, so a crash never leaves a torn index file
+                    tmp_path = f"{AGENT_INDEX_FILE}.tmp"
+                    async with aiofiles.open(tmp_path, 'w') as f:
+                        await f.write(str(self.last_used_index))
+                    await aiofiles.os.replace(tmp_path, AGENT_INDEX_FILE)
+                    self.dirty = False
+                    return
                 except Exception as e:
                     last_error = e
                     if attempt < max_retries - 1:
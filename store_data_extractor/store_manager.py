@@ -4,27 +4,45 @@ import aiohttp
 import logging
 import os
 import json
-from store_data_extractor.src.data_extractor import main_program
+import aiofiles
+from store_data_extractor.src.data_extractor import create_client_session, main_program
 from bot.discord_bot import DiscordBot
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Union
 from store_data_extractor.store_types import StoreConfigDataType, ProductDataType
 
 # Path to the stores configuration file
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "stores.json")
 
-store_config: Optional[List[StoreConfigDataType]] = None
-with open(CONFIG_PATH, 'r') as f:
-    store_config = json.load(f)
+
+async def load_store_config() -> List[StoreConfigDataType]:
+    """Read the stores configuration file."""
+    async with aiofiles.open(CONFIG_PATH, 'r') as f:
+        return json.loads(await f.read())
+
 
 SEMAPHORE = asyncio.Semaphore(3) # Limit the number of concurrent requests
 
+# Schedule field -> datetime attribute it restricts, minutes "*" not allowed, the rest allow "*"
+SCHEDULE_FIELDS = {"minutes": "minute", "hours": "hour", "days": "day", "months": "month", "years": "year"}
+
+
+def compile_schedule(schedule: Dict[str, Union[List[int], str]]) -> Callable[[datetime], bool]:
+    """Compile a store schedule into a check of the given time, "*" fields other than minutes are left out of it."""
+    checks = tuple(
+        # Minutes "*" is not allowed and matches no minute, so such a store never runs on schedule
+        (attribute, frozenset() if schedule[field] == "*" else frozenset(int(value) for value in schedule[field]))
+        for field, attribute in SCHEDULE_FIELDS.items()
+        if field == "minutes" or schedule[field] != "*"
+    )
+    return lambda now: all(getattr(now, attribute) in allowed for attribute, allowed in checks)
+
 # Import the global instance instead of the class
 from store_data_extractor.src.user_agent_manager import user_agent_manager
 
 class StoreManager:
     """Manage the stores and their data."""
     def __init__(self) -> None:
-        self.stores: Optional[List[StoreConfigDataType]] = store_config
+        self.stores: Optional[List[StoreConfigDataType]] = None # Loaded lazily, see load_stores
         self.session = None
         self.logger = logging.getLogger("StoreManager")
         from store_data_extractor.src.store_database import StoreDatabase
@@ -35,6 +53,7 @@ class StoreManager:
         self._stopped = False
         self.current_tasks: List[asyncio.Task] = []
         self._store_locks: Dict[str, asyncio.Lock] = {} # Prevent concurrent runs for the same store
+        self._schedules: Dict[str, Callable[[datetime], bool]] = {} # Store name -> compiled schedule, filled on first check
 
     def get_store_lock(self, store_name: str) -> asyncio.Lock:
         """Get (or create) the lock that serializes runs for a single store."""
@@ -42,12 +61,18 @@ class StoreManager:
             self._store_locks[store_name] = asyncio.Lock()
         return self._store_locks[store_name]
 
+    async def load_stores(self) -> List[StoreConfigDataType]:
+        """Load the stores configuration on first use."""
+        if self.stores is None:
+            self.stores = await load_store_config()
+        return self.stores
+
     async def start_session(self) -> None:
         """Start a new session."""
         self.logger.info("Starting session...")
         self._stopped = False
         if not self.session:
-            self.session: Optional[aiohttp.ClientSession] = aiohttp.ClientSession()
+            self.session: Optional[aiohttp.ClientSession] = create_client_session()
 
 
     async def stop_session(self) -> None:
@@ -65,6 +90,7 @@ class StoreManager:
 
     async def schedule_runner(self, discord_bot: DiscordBot) -> None:
         """Manage store updates based on schedule."""
+        await self.load_stores()
         await self.start_session()
         await self.run_startup_tasks(discord_bot)
         try:
@@ -99,7 +125,7 @@ class StoreManager:
         """Run the scheduled tasks for all stores."""
         tasks = []
         for store in self.stores or []:
-            if await self.should_run_now(store):
+            if self.should_run_now(store):
                 self.logger.info(f"Scheduling task for {store['name']}")
                 tasks.append(asyncio.create_task(self.fetch_store_data(discord_bot, store)))
 
@@ -110,34 +136,13 @@ class StoreManager:
         return len(tasks)
 
 
-    async def should_run_now(self, store: StoreConfigDataType) -> bool:
+    def should_run_now(self, store: StoreConfigDataType) -> bool:
         """Check if the store should be updated now."""
 
-        now = datetime.now()
-
-        schedule = store["schedule"]
-        minutes = schedule["minutes"]   # "*" not allowed
-        hours = schedule["hours"]       # "*" allowed
-        days = schedule["days"]         # "*" allowed
-        months = schedule["months"]     # "*" allowed
-        years = schedule["years"]       # "*" allowed
-
-        if str(now.minute) not in map(str, minutes):
-            return False
-
-        if hours != "*" and str(now.hour) not in map(str, hours):
-            return False
-
-        if days != "*" and str(now.day) not in map(str, days):
-            return False
-
-        if months != "*" and str(now.month) not in map(str, months):
-            return False
-
-        if years != "*" and str(now.year) not in map(str, years):
-            return False
-
-        return True
+        schedule = self._schedules.get(store["name"])
+        if schedule is None:
+            schedule = self._schedules[store["name"]] = compile_schedule(store["schedule"])
+        return schedule(datetime.now())
 
 
     async def fetch_unsent_products(self, store_name: str) -> Optional[List[ProductDataType]]:
@@ -195,7 +200,7 @@ class StoreManager:
                 self.logger.error(f"Error fetching data for {store['name']}: {e}")
             finally:
                 try:
-                    await self.user_agent_manager.save_index_after_task(force=True)
+                    await self.user_agent_manager.save_index_after_task() # Skips the write when no agent was used
                 except Exception as e:
                     self.logger.error(f"Failed to save user agent index: {e}")
 
@@ -225,10 +230,22 @@ class StoreManager:
                 except asyncio.CancelledError:
                     pass
 
+        # Persist the last user agent index before exiting
+        try:
+            await self.user_agent_manager.save_index_after_task(force=True)
+        except Exception as e:
+            self.logger.error(f"Failed to save user agent index: {e}")
+
         await self.stop_session()
 
 
     async def run_all_stores(self, discord_bot: DiscordBot) -> None:
-        """Fetch data for all stores."""
-        for store in self.stores or []:
-            await self.fetch_store_data(discord_bot, store)
+        """Fetch data for all stores concurrently, bounded by SEMAPHORE."""
+        await self.load_stores()
+        results = await asyncio.gather(
+            *(self.fetch_store_data(discord_bot, store) for store in self.stores or []),
+            return_exceptions=True,
+        )
+        for store, result in zip(self.stores or [], results):
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError):
+                self.logger.error(f"Error fetching data for {store['name']}: {result}")
@@ -45,3 +45,9 @@ class ProductBaseDataType(TypedDict):
 class ProductDataType(ProductBaseDataType, total=False):
     id: int
     archived: Optional[bool]
+
+class CachedPageDataType(TypedDict):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    product_urls: List[str]
+    next_url: Optional[str]
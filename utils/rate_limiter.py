@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket: allows bursts of up to `capacity` calls, then one call per `interval` seconds."""
+    def __init__(self, capacity: int, interval: float) -> None:
+        self.capacity = max(1, capacity)
+        self.interval = max(0.0, interval)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock() # Waiters are served in arrival order
+
+
+    async def acquire(self) -> None:
+        """Take one token, sleeping only when the bucket is empty."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if self.interval == 0:
+                    self.tokens = float(self.capacity)
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) / self.interval)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.interval)